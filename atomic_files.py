@@ -0,0 +1,31 @@
+import os
+import tempfile
+import contextlib
+
+
+# Атомарная запись файлов для результатов cli.py и дисковых кэшей:
+# данные пишутся во временный файл в том же каталоге и переименовываются
+# поверх целевого, поэтому при прерывании не остаётся недописанного файла.
+# mkstemp создаёт файл с правами 0600; перед переименованием права
+# выставляются как у обычного open(): 0666 с учётом umask процесса.
+# umask читается один раз при импорте - узнать его можно только установив
+# новый, а делать это при каждой записи из нескольких потоков небезопасно
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+@contextlib.contextmanager
+def atomic_write(path):
+    # Использование: with atomic_write(path) as f: f.write(data)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if hasattr(os, "fchmod"):
+                os.fchmod(f.fileno(), FILE_MODE)
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,366 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+import numpy as np
+import cv2
+from PIL import Image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Функции лабораторных берутся из модулей без Qt и Tk: замер работает
+# на машине без графического окружения
+import color_models
+import image_adjust
+import morphology
+import filters
+import features
+import video_processing
+
+
+# Набор размеров синтетических изображений (ширина, высота)
+SIZES = {
+    "vga": (640, 480),
+    "hd": (1280, 720),
+    "fhd": (1920, 1080),
+    "4k": (3840, 2160),
+    "12mp": (4000, 3000),
+    "50mp": (8660, 5773),
+}
+DEFAULT_SIZES = ("vga", "hd", "fhd")
+
+MORPH_OPERATIONS = {
+    "erode": cv2.MORPH_ERODE,
+    "dilate": cv2.MORPH_DILATE,
+    "open": cv2.MORPH_OPEN,
+    "close": cv2.MORPH_CLOSE,
+    "gradient": cv2.MORPH_GRADIENT,
+}
+MORPH_KERNEL_SIZES = (3, 5, 9, 15, 31)
+
+
+def synthetic_image(width, height, seed=0):
+    # Детерминированное изображение: градиент, случайные фигуры и слабый шум -
+    # у детекторов есть углы и текстура, у гистограмм - все уровни яркости
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[..., 0] = x[None, :]
+    img[..., 1] = y[:, None]
+    img[..., 2] = (x[None, :] + y[:, None]) / 2
+
+    # Плотность мелких фигур постоянна на единицу площади, поэтому число
+    # ключевых точек растёт пропорционально размеру изображения
+    shapes = max(50, width * height // 2000)
+    for _ in range(shapes):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cx, cy = int(rng.integers(0, width)), int(rng.integers(0, height))
+        size = int(rng.integers(4, 40))
+        kind = rng.random()
+        if kind < 0.4:
+            cv2.rectangle(img, (cx, cy), (cx + size, cy + size // 2 + 1), color, -1)
+        elif kind < 0.8:
+            cv2.circle(img, (cx, cy), size // 2 + 1, color, -1)
+        else:
+            end = (cx + int(rng.integers(-60, 61)), cy + int(rng.integers(-60, 61)))
+            cv2.line(img, (cx, cy), end, color, 2)
+
+    noise = rng.integers(0, 16, img.shape, dtype=np.uint8)
+    img = cv2.add(img, noise)
+    return cv2.subtract(img, (8, 8, 8, 0))
+
+
+def video_frame_count(width, height):
+    # Для больших кадров меньше кадров, чтобы видео помещалось в память
+    pixels = width * height
+    if pixels <= 2_100_000:
+        return 30
+    if pixels <= 12_000_000:
+        return 10
+    return 5
+
+
+def synthetic_video(width, height, frames, seed=0):
+    # Статичный фон и несколько движущихся прямоугольников
+    background = synthetic_image(width, height, seed)
+    rng = np.random.default_rng(seed + 1)
+    objects = []
+    for _ in range(4):
+        size = max(8, min(width, height) // 10)
+        objects.append((int(rng.integers(0, width // 2)), int(rng.integers(0, height - size)),
+                        size, tuple(int(c) for c in rng.integers(0, 256, 3))))
+    step = max(2, width // 100)
+    result = []
+    for i in range(frames):
+        frame = background.copy()
+        for x, y, size, color in objects:
+            x0 = (x + i * step) % max(1, width - size)
+            cv2.rectangle(frame, (x0, y), (x0 + size, y + size), color, -1)
+        result.append(frame)
+    return result
+
+
+def measure(fn, repeat):
+    # Прогрев, затем repeat замеров времени и отдельный прогон под tracemalloc
+    # (отслеживаются выделения numpy, в том числе результаты функций OpenCV;
+    # внутренние временные буферы OpenCV не учитываются)
+    start = time.perf_counter()
+    fn()
+    warmup = time.perf_counter() - start
+    if warmup > 2.0:
+        repeat = 1
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "mean_s": statistics.fmean(times),
+        "repeat": repeat,
+        "peak_bytes": peak,
+    }
+
+
+def lab1_operations(image):
+    pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    rng = np.random.default_rng(0)
+    pixels = [tuple(int(c) for c in p) for p in rng.integers(0, 256, (10000, 3))]
+
+    def conversions():
+        for r, g, b in pixels:
+            color_models.rgb_to_cmyk(r, g, b)
+            color_models.rgb_to_hsl(r, g, b)
+            color_models.rgb_to_hsv(r, g, b)
+            color_models.rgb_to_lab(r, g, b)
+            color_models.rgb_to_ycbcr(r, g, b)
+
+    return [
+        # Преобразования цветовых моделей выполняются по одному пикселю
+        # (при наведении мыши), поэтому замеряются на 10 000 пикселей
+        ("lab1.conversions_10k_pixels", conversions),
+        ("lab1.resize_for_display", lambda: color_models.resize_for_display(pil_image, 860, 480)),
+    ]
+
+
+def lab2_operations(image):
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+
+    def render_histogram(img, channel):
+        # Отрисовка как в draw_histogram, но на холсте Agg без Qt
+        canvas = FigureCanvasAgg(Figure(figsize=(5, 3)))
+        image_adjust.plot_histogram(canvas.figure, img, channel, "Benchmark")
+        canvas.draw()
+
+    return [
+        ("lab2.adjust_color", lambda: image_adjust.adjust_image_array(rgb, 20, 30, 40)),
+        ("lab2.adjust_gray", lambda: image_adjust.adjust_image_array(gray, 20, 30, 40)),
+        ("lab2.linear_correction", lambda: image_adjust.linear_correction(gray)),
+        ("lab2.gamma_correction", lambda: image_adjust.gamma_correction(gray, 1.5)),
+        ("lab2.histograms_rgb", lambda: image_adjust.compute_histograms(rgb, "RGB")),
+        ("lab2.histograms_gray", lambda: image_adjust.compute_histograms(gray, "RGB")),
+        ("lab2.histogram_render_rgb", lambda: render_histogram(rgb, "RGB")),
+        ("lab2.histogram_render_gray", lambda: render_histogram(gray, "RGB")),
+    ]
+
+
+def lab3_operations(image):
+    return [(f"lab3.{name}.k{k}", lambda op=op, k=k: morphology.morphology(image, op, k))
+            for k in MORPH_KERNEL_SIZES for name, op in MORPH_OPERATIONS.items()]
+
+
+def lab4_operations(image):
+    return [
+        ("lab4.sharpen", lambda: filters.apply_sharpen(image)),
+        ("lab4.motion_blur", lambda: filters.apply_motion_blur(image, 15)),
+        ("lab4.emboss", lambda: filters.apply_emboss(image)),
+        ("lab4.median", lambda: filters.apply_median(image, 5)),
+        ("lab4.canny", lambda: filters.apply_canny(image)),
+        ("lab4.roberts", lambda: filters.apply_roberts(image)),
+    ]
+
+
+def lab5_operations(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    operations = [
+        ("lab5.harris", lambda: cv2.cornerHarris(np.float32(gray), 2, 3, 0.04)),
+        ("lab5.sift", lambda: features.create_detector("SIFT").detect(gray, None)),
+        ("lab5.fast", lambda: features.create_detector("FAST").detect(gray, None)),
+        ("lab5.harris_tiled", lambda: features.detect_keypoints_tiled(gray, "Harris")),
+        ("lab5.sift_tiled", lambda: features.detect_keypoints_tiled(gray, "SIFT")),
+        ("lab5.fast_tiled", lambda: features.detect_keypoints_tiled(gray, "FAST")),
+    ]
+    try:
+        features.create_detector("SURF")
+        operations.append(("lab5.surf", lambda: features.create_detector("SURF").detect(gray, None)))
+    except AttributeError:
+        pass
+
+    # Сопоставление с повёрнутой копией изображения (правило Лоу)
+    h, w = gray.shape
+    rotation = cv2.getRotationMatrix2D((w / 2, h / 2), 5, 1.0)
+    rotated = cv2.warpAffine(gray, rotation, (w, h))
+    sift = cv2.SIFT_create(nfeatures=1000)
+    _, des1 = sift.detectAndCompute(gray, None)
+    _, des2 = sift.detectAndCompute(rotated, None)
+    if des1 is not None and des2 is not None:
+        operations.append(("lab5.ratio_test_1000", lambda: features.ratio_test_matches(des1, des2)))
+
+    frames = synthetic_video(w, h, video_frame_count(w, h))
+
+    def mog2():
+        fgbg = cv2.createBackgroundSubtractorMOG2()
+        for frame in frames:
+            fgbg.apply(frame)
+
+    def mog2_blur():
+        fgbg = cv2.createBackgroundSubtractorMOG2()
+        for frame in frames:
+            video_processing.blur_moving_objects(frame, fgbg.apply(frame))
+
+    def mog2_roi_blur():
+        roi_blur = video_processing.RoiMotionBlur(fast_blur=True)
+        for frame in frames:
+            roi_blur.apply(frame.copy())
+
+    # Время видео-операций - на все кадры; FPS считается в отчёте
+    operations += [
+        (f"lab5.mog2_x{len(frames)}", mog2),
+        (f"lab5.mog2_blur_x{len(frames)}", mog2_blur),
+        (f"lab5.mog2_roi_blur_x{len(frames)}", mog2_roi_blur),
+    ]
+    return operations
+
+
+OPERATION_GROUPS = {
+    "lab1": lab1_operations,
+    "lab2": lab2_operations,
+    "lab3": lab3_operations,
+    "lab4": lab4_operations,
+    "lab5": lab5_operations,
+}
+
+
+def run_benchmarks(sizes, op_filters=None, repeat=5, log=print):
+    results = {}
+    for size_name in sizes:
+        width, height = SIZES[size_name]
+        image = synthetic_image(width, height)
+        for group, make_operations in OPERATION_GROUPS.items():
+            # Группа пропускается целиком (без подготовки данных), если ни один
+            # фильтр не может совпасть с её операциями
+            if op_filters and not any(f.startswith(group) or group.startswith(f)
+                                      for f in op_filters):
+                continue
+            for name, fn in make_operations(image):
+                if op_filters and not any(name.startswith(f) for f in op_filters):
+                    continue
+                key = f"{name}@{size_name}"
+                result = measure(fn, repeat)
+                suffix = name.rsplit("_x", 1)
+                if len(suffix) == 2 and suffix[1].isdigit():
+                    result["fps"] = int(suffix[1]) / result["median_s"]
+                results[key] = result
+                log(f"{key:<40} {result['median_s'] * 1000:10.2f} ms "
+                    f"{result['peak_bytes'] / 1e6:10.1f} MB")
+    return results
+
+
+def environment_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, threshold=0.1):
+    # Сравнение медиан с эталоном: ratio > 1 - медленнее эталона
+    rows = []
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            rows.append((key, None, result["median_s"], None, "new"))
+            continue
+        ratio = result["median_s"] / base["median_s"] if base["median_s"] > 0 else float("inf")
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+        elif ratio < 1 - threshold:
+            status = "faster"
+        else:
+            status = "same"
+        rows.append((key, base["median_s"], result["median_s"], ratio, status))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'operation':<40} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}  status")
+    for key, base, current, ratio, status in rows:
+        base_text = f"{base * 1000:12.2f}" if base is not None else f"{'-':>12}"
+        ratio_text = f"{ratio:7.2f}" if ratio is not None else f"{'-':>7}"
+        print(f"{key:<40} {base_text} {current * 1000:12.2f} {ratio_text}  {status}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк операций лабораторных работ (без GUI)")
+    parser.add_argument("--sizes", nargs="+", default=list(DEFAULT_SIZES),
+                        help=f"размеры изображений: {', '.join(SIZES)} или all")
+    parser.add_argument("--ops", nargs="+",
+                        help="префиксы операций, например lab3 или lab5.sift")
+    parser.add_argument("--repeat", type=int, default=5, help="число замеров на операцию")
+    parser.add_argument("--output", default="benchmark_results.json", help="файл результатов JSON")
+    parser.add_argument("--baseline", help="файл эталонных результатов для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="допустимое относительное замедление")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="сохранить результаты также как эталон (--baseline)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="код возврата 1 при замедлении относительно эталона")
+    args = parser.parse_args(argv)
+
+    sizes = list(SIZES) if args.sizes == ["all"] else args.sizes
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"неизвестные размеры: {', '.join(unknown)}")
+
+    results = run_benchmarks(sizes, args.ops, args.repeat)
+    report = {"meta": environment_info(), "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Результаты сохранены в {args.output}")
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Эталон сохранён в {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, args.threshold)
+        print_comparison(rows)
+        if args.fail_on_regression and any(row[4] == "REGRESSION" for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import operations
+from atomic_files import atomic_write
+
+
+# Пакетная обработка без окон: операции лабораторных (operations.OPERATIONS)
+# применяются по цепочке к каждому изображению каталога.
+#   python cli.py SRC DST lab2.gray + lab2.gamma gamma=2 + lab4.canny
+#   python cli.py --list
+# Файлы перебираются лениво, в обработке одновременно не больше
+# 2 * workers файлов. Результат, который новее исходного файла, не
+# пересчитывается, поэтому прерванный запуск можно просто повторить.
+# Цепочка операций записывается в DST/MANIFEST_NAME: в каталог с результатами
+# другой цепочки без --force писать нельзя, иначе старые результаты
+# считались бы готовыми
+
+RESULT_EXTENSIONS = {"array": ".npy", "json": ".json"}
+MANIFEST_NAME = ".cli_manifest.json"
+
+
+def parse_steps(tokens):
+    # ["lab2.gray", "+", "lab2.gamma", "gamma=2"] -> [(имя, параметры), ...]
+    steps, current = [], []
+    for token in tokens + ["+"]:
+        if token != "+":
+            current.append(token)
+            continue
+        if not current:
+            raise ValueError("Пустой шаг цепочки (лишний '+')")
+        name, raw = current[0], {}
+        if name not in operations.OPERATIONS:
+            raise ValueError(f"Неизвестная операция: {name} (список: --list)")
+        for item in current[1:]:
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise ValueError(f"Параметр должен иметь вид имя=значение: {item}")
+            raw[key] = value
+        steps.append((name, operations.parse_params(name, raw)))
+        current = []
+    for name, params in steps[:-1]:
+        if operations.result_kind(name, params) != "image":
+            raise ValueError(f"{name} возвращает не изображение и может быть только последним шагом")
+    return steps
+
+
+def walk_images(root, recursive=True, exclude=None):
+    # Генератор путей изображений: каталоги читаются по одному через os.scandir,
+    # список всех файлов дерева в памяти не строится. exclude - каталог,
+    # который не обходится (результаты, если они лежат внутри исходного дерева)
+    exclude = os.path.realpath(exclude) if exclude else None
+    if os.path.isfile(root):
+        yield root
+        return
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError as e:
+            print(f"Не удалось прочитать каталог {directory}: {e}")
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive and os.path.realpath(entry.path) != exclude:
+                    subdirs.append(entry.path)
+            elif entry.name.lower().endswith(operations.IMAGE_EXTENSIONS):
+                yield entry.path
+        stack.extend(reversed(subdirs))
+
+
+def output_path(src, src_root, dst_root, extension):
+    if os.path.isfile(src_root):
+        relative = os.path.basename(src)
+    else:
+        relative = os.path.relpath(src, src_root)
+    return os.path.join(dst_root, os.path.splitext(relative)[0] + extension)
+
+
+def plan_tasks(src_root, dst_root, extension, force=False, recursive=True, counts=None):
+    # Генератор пар (исходный файл, файл результата) без уже готовых результатов.
+    # counts - словарь счётчиков "skipped" (готовые) и "collisions" (файлы
+    # одного каталога, отличающиеся только расширением, например a.png и a.jpg:
+    # результат получает только первый из них)
+    counts = counts if counts is not None else {}
+    counts.setdefault("skipped", 0)
+    counts.setdefault("collisions", 0)
+    directory, owners = None, {}
+    for src in walk_images(src_root, recursive, exclude=dst_root):
+        dst = output_path(src, src_root, dst_root, extension)
+        # Совпасть могут только результаты файлов одного каталога, а каталоги
+        # обходятся по одному - поэтому помнить имена нужно только для текущего
+        if os.path.dirname(dst) != directory:
+            directory, owners = os.path.dirname(dst), {}
+        if dst in owners:
+            counts["collisions"] += 1
+            print(f"{src}: ошибка: результат {dst} уже получен из {owners[dst]}")
+            continue
+        owners[dst] = src
+        if not force:
+            try:
+                if os.stat(dst).st_mtime >= os.stat(src).st_mtime:
+                    counts["skipped"] += 1
+                    continue
+            except FileNotFoundError:
+                pass
+        yield src, dst
+
+
+def chain_manifest(steps, image_format):
+    steps = [[name, params] for name, params in steps]
+    digest = hashlib.sha1(json.dumps([steps, image_format], sort_keys=True).encode()).hexdigest()
+    return {"steps": steps, "format": image_format, "hash": digest}
+
+
+def check_manifest(dst_root, manifest, force=False):
+    # Записывает манифест цепочки в DST. ValueError, если там уже результаты
+    # другой цепочки и не указан --force
+    path = os.path.join(dst_root, MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            previous = json.load(f)
+    except FileNotFoundError:
+        previous = None
+    except ValueError:
+        previous = {}
+    if previous is not None and previous.get("hash") != manifest["hash"] and not force:
+        raise ValueError(f"В {dst_root} результаты другой цепочки ({path}); "
+                         f"укажите --force, чтобы пересчитать, или другой каталог")
+    if previous != manifest:
+        write_atomic(path, json.dumps(manifest, ensure_ascii=False, indent=2).encode())
+
+
+def write_atomic(path, data):
+    # Запись во временный файл рядом и переименование: при прерывании
+    # не остаётся недописанного результата с новым mtime
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with atomic_write(path) as f:
+        f.write(data)
+
+
+def process_file(src, dst, steps, image_format):
+    # Выполняется в процессе пула; возвращает время обработки
+    from image_cache import decode_file
+    start = time.perf_counter()
+    result = decode_file(src)
+    if result is None:
+        raise ValueError("не удалось декодировать изображение")
+    for name, params in steps:
+        result = operations.apply_operation(name, result, params)
+    _, data = operations.encode_result(result, image_format)
+    write_atomic(dst, data)
+    return time.perf_counter() - start
+
+
+def run_pipeline(src_root, dst_root, steps, workers=None, image_format="png", force=False,
+                 recursive=True):
+    # Возвращает (обработано, пропущено, ошибок, время)
+    last_name, last_params = steps[-1]
+    kind = operations.result_kind(last_name, last_params)
+    extension = RESULT_EXTENSIONS.get(kind, "." + image_format)
+    check_manifest(dst_root, chain_manifest(steps, image_format), force)
+    workers = workers or os.cpu_count() or 1
+    limit = workers * 2
+    counts = {}
+    done = failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=operations.init_worker) as pool:
+        pending = {}
+
+        def collect(futures):
+            nonlocal done, failed
+            for future in futures:
+                src = pending.pop(future)
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"{src}: ошибка: {e}")
+                    continue
+                done += 1
+                print(f"[{done}] {src}: {seconds * 1000:.0f} мс")
+
+        for src, dst in plan_tasks(src_root, dst_root, extension, force, recursive, counts):
+            if len(pending) >= limit:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            pending[pool.submit(process_file, src, dst, steps, image_format)] = src
+        collect(wait(pending)[0])
+    failed += counts["collisions"]
+    return done, counts["skipped"], failed, time.perf_counter() - start
+
+
+def print_operations():
+    for name, (_, defaults, kind) in operations.OPERATIONS.items():
+        params = " ".join(f"{key}={value}" for key, value in defaults.items())
+        kind = "image|json" if callable(kind) else kind
+        print(f"{name:<18} -> {kind:<10} {params}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Пакетная обработка изображений операциями лабораторных",
+        usage="%(prog)s [параметры] SRC DST ОПЕРАЦИЯ [имя=значение ...] [+ ОПЕРАЦИЯ ...]\n"
+              "       %(prog)s --list")
+    parser.add_argument("src", nargs="?", help="файл или каталог с изображениями")
+    parser.add_argument("dst", nargs="?", help="каталог результатов (структура подкаталогов сохраняется)")
+    parser.add_argument("steps", nargs="*", help="цепочка операций через '+'")
+    parser.add_argument("--list", action="store_true", help="показать операции и их параметры")
+    parser.add_argument("--workers", type=int, help="число процессов (по умолчанию - число ядер)")
+    parser.add_argument("--format", default="png", choices=("png", "jpg", "npy"),
+                        help="формат результатов-изображений")
+    parser.add_argument("--force", action="store_true", help="пересчитать и уже готовые результаты")
+    parser.add_argument("--no-recursive", action="store_true", help="не заходить в подкаталоги")
+    # Параметры можно указывать и после цепочки: "SRC DST lab4.canny --workers 4"
+    args = parser.parse_intermixed_args()
+
+    if args.list:
+        print_operations()
+        return
+    if not args.src or not args.dst or not args.steps:
+        parser.error("укажите SRC, DST и хотя бы одну операцию")
+    if not os.path.exists(args.src):
+        parser.error(f"нет такого файла или каталога: {args.src}")
+    try:
+        steps = parse_steps(args.steps)
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        done, skipped, failed, seconds = run_pipeline(args.src, args.dst, steps, args.workers, args.format,
+                                                      args.force, not args.no_recursive)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    rate = done / seconds if seconds > 0 else 0.0
+    print(f"Обработано: {done}, пропущено готовых: {skipped}, ошибок: {failed} "
+          f"за {seconds:.2f} с ({rate:.1f} файлов/с)")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
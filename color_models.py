@@ -0,0 +1,319 @@
+import os
+import math
+import json
+import time
+from PIL import Image
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+futures = lazy_import("concurrent.futures")
+
+
+# Color models of lab_1 without the Tk viewer: usable from benchmark.py,
+# operations.py and the batch statistics mode on hosts without Tk
+
+# Color conversion functions
+def rgb_to_cmyk(r, g, b):
+    if (r, g, b) == (0, 0, 0):
+        return 0, 0, 0, 1
+    c = 1 - r / 255
+    m = 1 - g / 255
+    y = 1 - b / 255
+    k = min(c, m, y)
+    c = (c - k) / (1 - k) if (1 - k) != 0 else 0
+    m = (m - k) / (1 - k) if (1 - k) != 0 else 0
+    y = (y - k) / (1 - k) if (1 - k) != 0 else 0
+    return c, m, y, k
+
+
+def rgb_to_hsl(r, g, b):
+    r, g, b = r / 255, g / 255, b / 255
+    max_val = max(r, g, b)
+    min_val = min(r, g, b)
+    h = s = l = (max_val + min_val) / 2
+
+    if max_val != min_val:
+        d = max_val - min_val
+        s = d / (2 - max_val - min_val) if l > 0.5 else d / (max_val + min_val)
+        if max_val == r:
+            h = (g - b) / d + (6 if g < b else 0)
+        elif max_val == g:
+            h = (b - r) / d + 2
+        else:
+            h = (r - g) / d + 4
+        h /= 6
+    return round(h * 360, 1), round(s, 3), round(l, 3)
+
+
+def rgb_to_hsv(r, g, b):
+    r, g, b = r / 255, g / 255, b / 255
+    max_val = max(r, g, b)
+    min_val = min(r, g, b)
+    h = s = v = max_val
+
+    d = max_val - min_val
+    s = 0 if max_val == 0 else d / max_val
+
+    if max_val != min_val:
+        if max_val == r:
+            h = (g - b) / d + (6 if g < b else 0)
+        elif max_val == g:
+            h = (b - r) / d + 2
+        else:
+            h = (r - g) / d + 4
+        h /= 6
+    return round(h * 360, 1), round(s, 3), round(v, 3)
+
+
+def rgb_to_lab(r, g, b):
+    # Simplified conversion (accurate conversion requires XYZ space)
+    l = 0.2126 * r + 0.7152 * g + 0.0722 * b
+    a = 1.4749 * (0.2215 * r - 0.3390 * g + 0.1175 * b) + 128
+    b_lab = 0.6245 * (0.1949 * r + 0.6057 * g - 0.8006 * b) + 128
+    return round(l / 2.55, 1), round(a - 128, 1), round(b_lab - 128, 1)
+
+
+def rgb_to_ycbcr(r, g, b):
+    y = 0.299 * r + 0.587 * g + 0.114 * b
+    cb = 128 - 0.168736 * r - 0.331264 * g + 0.5 * b
+    cr = 128 + 0.5 * r - 0.418688 * g - 0.081312 * b
+    return round(y, 1), round(cb, 1), round(cr, 1)
+
+
+COLOR_MODELS = {
+    "CMYK": rgb_to_cmyk,
+    "HSL": rgb_to_hsl,
+    "HSV": rgb_to_hsv,
+    "LAB": rgb_to_lab,
+    "YCbCr": rgb_to_ycbcr,
+}
+
+
+def pixel_color_models(r, g, b):
+    # All color models of one pixel, same values as the "Color Models" panel
+    values = {"RGB": (r, g, b)}
+    for model, convert in COLOR_MODELS.items():
+        values[model] = convert(r, g, b)
+    return values
+
+
+def _hue(r, g, b, max_val, d):
+    # Vectorized hue shared by HSL and HSV, in [0, 1) (d > 0 only)
+    safe_d = np.where(d > 0, d, 1)
+    h = np.where(max_val == r, (g - b) / safe_d + np.where(g < b, 6, 0),
+                 np.where(max_val == g, (b - r) / safe_d + 2, (r - g) / safe_d + 4))
+    return h / 6
+
+
+def convert_image(rgb, model):
+    # Vectorized rgb_to_* for a whole (H, W, 3) RGB uint8 image.
+    # Returns float32 (H, W, channels) with the same units as the scalar
+    # functions (hue in degrees), without rounding
+    r, g, b = (rgb[..., i].astype(np.float32) for i in range(3))
+    if model == "CMYK":
+        c, m, y = 1 - r / 255, 1 - g / 255, 1 - b / 255
+        k = np.minimum(np.minimum(c, m), y)
+        denom = np.where(k < 1, 1 - k, 1)
+        channels = [np.where(k < 1, (c - k) / denom, 0) for c in (c, m, y)] + [k]
+    elif model in ("HSL", "HSV"):
+        r, g, b = r / 255, g / 255, b / 255
+        max_val = np.maximum(np.maximum(r, g), b)
+        min_val = np.minimum(np.minimum(r, g), b)
+        d = max_val - min_val
+        if model == "HSL":
+            l = (max_val + min_val) / 2
+            total = np.where(l > 0.5, 2 - max_val - min_val, max_val + min_val)
+            s = np.where(d > 0, d / np.where(total > 0, total, 1), l)
+            last = l
+        else:
+            s = np.where(max_val > 0, d / np.where(max_val > 0, max_val, 1), 0)
+            last = max_val
+        # As in the scalar functions, achromatic pixels keep h = l (HSL) or h = v (HSV)
+        h = np.where(d > 0, _hue(r, g, b, max_val, d), last)
+        channels = [h * 360, s, last]
+    elif model == "LAB":
+        channels = [(0.2126 * r + 0.7152 * g + 0.0722 * b) / 2.55,
+                    1.4749 * (0.2215 * r - 0.3390 * g + 0.1175 * b),
+                    0.6245 * (0.1949 * r + 0.6057 * g - 0.8006 * b)]
+    elif model == "YCbCr":
+        channels = [0.299 * r + 0.587 * g + 0.114 * b,
+                    128 - 0.168736 * r - 0.331264 * g + 0.5 * b,
+                    128 + 0.5 * r - 0.418688 * g - 0.081312 * b]
+    else:
+        raise ValueError(f"Unknown color model: {model}")
+    return np.stack(channels, axis=-1).astype(np.float32)
+
+
+# Batch color statistics (python lab_1.py --stats FOLDER ...).
+# Pixels are quantized to 32 levels per channel and counted in one bincount;
+# everything else (channel histograms of every model, dominant colors) is
+# computed from the 32^3 histogram, not from the pixels
+HIST_BITS = 5
+HIST_SHIFT = 8 - HIST_BITS
+HIST_SIDE = 1 << HIST_BITS
+STATS_MAX_PIXELS = 1 << 18
+
+# Channel names and value ranges of every model for the per-channel histograms
+MODEL_CHANNELS = {
+    "RGB": (("R", 0, 256), ("G", 0, 256), ("B", 0, 256)),
+    "CMYK": (("C", 0, 1), ("M", 0, 1), ("Y", 0, 1), ("K", 0, 1)),
+    "HSL": (("H", 0, 360), ("S", 0, 1), ("L", 0, 1)),
+    "HSV": (("H", 0, 360), ("S", 0, 1), ("V", 0, 1)),
+    "LAB": (("L", 0, 100), ("a", -128, 128), ("b", -128, 128)),
+    "YCbCr": (("Y", 0, 256), ("Cb", 0, 256), ("Cr", 0, 256)),
+}
+
+_bin_colors = None
+_channel_bins = {}
+
+
+def subsample(rgb, max_pixels=STATS_MAX_PIXELS):
+    # Every n-th pixel in both directions so that at most ~max_pixels remain
+    step = math.ceil(math.sqrt(rgb.shape[0] * rgb.shape[1] / max_pixels))
+    return rgb[::step, ::step] if step > 1 else rgb
+
+
+def load_rgb_reduced(path, max_pixels=STATS_MAX_PIXELS):
+    # JPEGs are decoded directly at 1/2..1/8 scale (draft), which is where
+    # most of the time goes for large photos; other formats are subsampled
+    with Image.open(path) as image:
+        size = image.size
+        scale = math.sqrt(size[0] * size[1] / max_pixels)
+        if scale > 1:
+            image.draft("RGB", (int(size[0] / scale), int(size[1] / scale)))
+        rgb = np.asarray(image.convert("RGB"))
+    return subsample(rgb, max_pixels), size
+
+
+def color_histogram(rgb):
+    # Counts of the 32^3 quantized colors, bin = (r >> 3) << 10 | (g >> 3) << 5 | b >> 3
+    q = rgb >> HIST_SHIFT
+    index = ((q[..., 0].astype(np.uint16) << (2 * HIST_BITS))
+             | (q[..., 1].astype(np.uint16) << HIST_BITS) | q[..., 2])
+    return np.bincount(index.ravel(), minlength=HIST_SIDE ** 3)
+
+
+def bin_colors():
+    # RGB center of every histogram bin, (32^3, 3) uint8 in bincount order
+    global _bin_colors
+    if _bin_colors is None:
+        levels = (np.arange(HIST_SIDE) << HIST_SHIFT) + (1 << HIST_SHIFT) // 2
+        r, g, b = np.meshgrid(levels, levels, levels, indexing="ij")
+        _bin_colors = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=-1).astype(np.uint8)
+    return _bin_colors
+
+
+def channel_bin_indices(bins):
+    # For every color bin, its bin in each channel histogram of each model.
+    # The models are converted once per process (32^3 colors), after that a
+    # channel histogram is one weighted bincount of the color histogram
+    if bins not in _channel_bins:
+        colors = bin_colors()
+        indices = {}
+        for model, channels in MODEL_CHANNELS.items():
+            values = colors.astype(np.float32) if model == "RGB" else convert_image(colors[None], model)[0]
+            for i, (name, low, high) in enumerate(channels):
+                index = np.floor((values[:, i] - low) / (high - low) * bins).astype(np.intp)
+                indices[model, name] = np.clip(index, 0, bins - 1)
+        _channel_bins[bins] = indices
+    return _channel_bins[bins]
+
+
+def dominant_colors(counts, count=5, radius=1):
+    # Peaks of the 3-D histogram: the fullest bin and its neighbours within
+    # radius bins form one color (count-weighted mean of the bin centers);
+    # they are then cleared so the next peak is a visibly different color
+    cube = counts.reshape((HIST_SIDE,) * 3).copy()
+    centers = bin_colors().reshape((HIST_SIDE,) * 3 + (3,))
+    total = counts.sum()
+    result = []
+    for _ in range(count):
+        peak = int(cube.argmax())
+        if cube.flat[peak] == 0:
+            break
+        window = tuple(slice(max(c - radius, 0), c + radius + 1)
+                       for c in np.unravel_index(peak, cube.shape))
+        weights = cube[window]
+        share = weights.sum()
+        rgb = (centers[window] * weights[..., None]).sum(axis=(0, 1, 2)) / share
+        result.append((tuple(int(round(v)) for v in rgb), share / total))
+        cube[window] = 0
+    return result
+
+
+def image_color_stats(rgb, bins=32, colors=5):
+    # Channel histograms (fractions of pixels) of all models and dominant
+    # colors of an RGB uint8 image. Values come from bin centers, so they are
+    # accurate to half a bin (4 levels of 255)
+    counts = color_histogram(rgb)
+    total = counts.sum()
+    indices = channel_bin_indices(bins)
+    histograms = {}
+    for model, channels in MODEL_CHANNELS.items():
+        histograms[model] = {
+            name: (np.bincount(indices[model, name], weights=counts, minlength=bins) / total).round(5).tolist()
+            for name, _, _ in channels
+        }
+    mean = counts @ bin_colors() / total
+    dominant = []
+    for (r, g, b), share in dominant_colors(counts, colors):
+        dominant.append({"rgb": [r, g, b], "hex": f"#{r:02x}{g:02x}{b:02x}",
+                         "share": round(float(share), 4), "models": pixel_color_models(r, g, b)})
+    return {"mean_rgb": [round(float(v), 1) for v in mean], "dominant": dominant,
+            "histograms": histograms}
+
+
+def file_color_stats(path, bins=32, colors=5, max_pixels=STATS_MAX_PIXELS):
+    start = time.perf_counter()
+    rgb, (width, height) = load_rgb_reduced(path, max_pixels)
+    stats = {"path": path, "width": width, "height": height,
+             "sampled_pixels": rgb.shape[0] * rgb.shape[1]}
+    stats.update(image_color_stats(rgb, bins, colors))
+    stats["seconds"] = round(time.perf_counter() - start, 4)
+    return stats
+
+
+def batch_color_stats(paths, out_path, workers=None, **options):
+    # Statistics of many images in a process pool, one JSON line per image in
+    # completion order. paths may be a lazy iterator: at most 2 * workers
+    # images are in flight at a time
+    workers = workers or os.cpu_count() or 1
+    done = failed = 0
+    start = time.perf_counter()
+    with open(out_path, "w", encoding="utf-8") as out, \
+            futures.ProcessPoolExecutor(max_workers=workers, initializer=channel_bin_indices,
+                                        initargs=(options.get("bins", 32),)) as pool:
+        pending = {}
+
+        def collect(finished):
+            nonlocal done, failed
+            for future in finished:
+                path = pending.pop(future)
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"{path}: error: {e}")
+                    continue
+                done += 1
+                out.write(json.dumps(stats, ensure_ascii=False) + "\n")
+                top = ", ".join(c["hex"] for c in stats["dominant"])
+                print(f"[{done}] {path}: {stats['seconds'] * 1000:.1f} ms, dominant {top}")
+
+        for path in paths:
+            if len(pending) >= workers * 2:
+                collect(futures.wait(pending, return_when=futures.FIRST_COMPLETED)[0])
+            pending[pool.submit(file_color_stats, path, **options)] = path
+        collect(futures.wait(pending)[0])
+    total_time = time.perf_counter() - start
+    rate = done / total_time if total_time > 0 else 0.0
+    print(f"Images: {done}, errors: {failed}, {total_time:.2f} s ({rate:.1f} images/s) -> {out_path}")
+    return done, failed
+
+
+def resize_for_display(image, max_width, max_height):
+    # Resize keeping aspect ratio (used for the preview canvas)
+    img_width, img_height = image.size
+    ratio = min(max_width / img_width, max_height / img_height)
+    new_size = (int(img_width * ratio), int(img_height * ratio))
+    return image.resize(new_size, Image.LANCZOS)
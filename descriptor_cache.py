@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+import threading
+from lazy_imports import lazy_import
+from atomic_files import atomic_write
+
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+
+
+# Каталог кэша по умолчанию; можно переопределить переменной окружения
+DEFAULT_CACHE_DIR = os.environ.get(
+    "LAB_DESCRIPTOR_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "sstu-image-labs", "descriptors"))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Сколько словарей визуальных слов хранится (самые старые удаляются)
+MAX_VOCABULARIES = 16
+
+# Хэши файлов запоминаются по (путь, mtime, размер), чтобы не перечитывать файл
+_file_hashes = {}
+
+
+def file_hash(path):
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    digest = _file_hashes.get(memo_key)
+    if digest is None:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _file_hashes[memo_key] = digest
+    return digest
+
+
+def keypoints_to_array(keypoints):
+    # Ключевая точка -> строка (x, y, size, angle, response, octave, class_id)
+    arr = np.empty((len(keypoints), 7), dtype=np.float32)
+    for i, kp in enumerate(keypoints):
+        arr[i] = (kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave, kp.class_id)
+    return arr
+
+
+def array_to_keypoints(arr):
+    return [cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response),
+                         int(octave), int(class_id))
+            for x, y, size, angle, response, octave, class_id in arr]
+
+
+class DescriptorCache:
+    # Дисковый кэш ключевых точек и дескрипторов. Ключ - хэш содержимого файла
+    # и параметры детектора. Каждая запись - два файла .npy (точки и дескрипторы),
+    # которые читаются через mmap. Файлы записываются во временный файл и
+    # атомарно переименовываются, поэтому параллельные читатели никогда не видят
+    # недописанную запись. При превышении лимита удаляются давно не использованные записи.
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, enabled=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled and os.environ.get("LAB_DESCRIPTOR_CACHE", "1") != "0"
+        self.size = None  # оценка занятого места, считается при первой записи
+        self.lock = threading.Lock()
+
+    def key(self, path, params):
+        params_text = json.dumps(params, sort_keys=True)
+        return hashlib.sha1(f"{file_hash(path)}:{params_text}".encode()).hexdigest()
+
+    def entry_key(self, path, params):
+        # Ключ записи или None, если кэш выключен или файл не прочитать
+        if not self.enabled or not path:
+            return None
+        try:
+            return self.key(path, params)
+        except OSError:
+            return None
+
+    def _paths(self, key):
+        shard = os.path.join(self.directory, key[:2])
+        return (os.path.join(shard, f"{key}.kp.npy"),
+                os.path.join(shard, f"{key}.des.npy"))
+
+    def load(self, key):
+        kp_path, des_path = self._paths(key)
+        try:
+            # Запись считается полной, только если есть файл точек:
+            # он записывается последним
+            kp = np.load(kp_path, mmap_mode="r")
+            des = np.load(des_path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            os.utime(kp_path)
+        except OSError:
+            pass
+        return array_to_keypoints(kp), (des if des.size else None)
+
+    def _write_atomic(self, path, array):
+        with atomic_write(path) as f:
+            np.save(f, array)
+        return os.path.getsize(path)
+
+    def store(self, key, keypoints, descriptors):
+        kp_path, des_path = self._paths(key)
+        os.makedirs(os.path.dirname(kp_path), exist_ok=True)
+        if descriptors is None:
+            descriptors = np.empty((0, 0), dtype=np.float32)
+        written = self._write_atomic(des_path, np.ascontiguousarray(descriptors))
+        written += self._write_atomic(kp_path, keypoints_to_array(keypoints))
+        with self.lock:
+            if self.size is None:
+                self.size = self._scan_size()
+            else:
+                self.size += written
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".kp.npy"):
+                    try:
+                        stat = entry.stat()
+                        des_path = entry.path[:-len(".kp.npy")] + ".des.npy"
+                        des_size = os.path.getsize(des_path) if os.path.exists(des_path) else 0
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size + des_size, entry.path, des_path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _, _ in self._entries())
+
+    def evict(self):
+        # Удаление самых старых записей, пока кэш не уменьшится до 90% лимита.
+        # Открытые через mmap файлы остаются доступны читателям и после удаления
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, kp_path, des_path in entries:
+            if total <= target:
+                break
+            for path in (kp_path, des_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+        self.size = total
+
+    def get_or_compute(self, path, params, compute):
+        # compute() вызывается только при промахе и возвращает (keypoints, descriptors)
+        key = self.entry_key(path, params)
+        if key is None:
+            return compute()
+        cached = self.load(key)
+        if cached is not None:
+            return cached
+        keypoints, descriptors = compute()
+        try:
+            self.store(key, keypoints, descriptors)
+        except OSError as e:
+            print(f"Не удалось сохранить дескрипторы в кэш: {e}")
+        return keypoints, descriptors
+
+    def _vocabulary_path(self, key):
+        return os.path.join(self.directory, "vocabulary", f"{key}.npy")
+
+    def load_vocabulary(self, key):
+        # Словарь визуальных слов (центры k-means), построенный по набору записей
+        if not self.enabled:
+            return None
+        path = self._vocabulary_path(key)
+        try:
+            centers = np.load(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return centers
+
+    def store_vocabulary(self, key, centers):
+        if not self.enabled:
+            return
+        path = self._vocabulary_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_atomic(path, np.ascontiguousarray(centers))
+            stored = sorted(os.scandir(os.path.dirname(path)), key=lambda e: e.stat().st_mtime)
+            for entry in stored[:-MAX_VOCABULARIES]:
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"Не удалось сохранить словарь в кэш: {e}")
+
+
+# Общий экземпляр для лабораторных работ
+descriptor_cache = DescriptorCache()
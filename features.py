@@ -0,0 +1,504 @@
+import os
+import json
+import time
+import hashlib
+from collections import deque
+from lazy_imports import lazy_import
+from descriptor_cache import descriptor_cache, keypoints_to_array, array_to_keypoints
+from image_cache import decoded_images
+
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+futures = lazy_import("concurrent.futures")
+
+
+# Особые точки лабораторной 5 без Qt: детекторы, отслеживание точек,
+# поиск похожих изображений по визуальным словам
+
+def create_detector(detector_type):
+    # Детекторы, поддерживаемые detect_keypoints (кроме Харриса).
+    # Для SURF без opencv-contrib выбрасывается AttributeError
+    if detector_type == "SIFT":
+        return cv2.SIFT_create()
+    if detector_type == "SURF":
+        return cv2.xfeatures2d.SURF_create()
+    if detector_type == "FAST":
+        return cv2.FastFeatureDetector_create()
+    raise ValueError(f"Неизвестный детектор: {detector_type}")
+
+
+def harris_keypoints(gray, max_points=None, threshold_ratio=0.01, nms_size=5):
+    # Углы Харриса как ключевые точки: локальные максимумы отклика выше
+    # порога относительно максимума в этом изображении (или тайле)
+    dst = cv2.cornerHarris(np.float32(gray), 2, 3, 0.04)
+    local_max = dst == cv2.dilate(dst, np.ones((nms_size, nms_size), np.uint8))
+    ys, xs = np.nonzero(local_max & (dst > threshold_ratio * dst.max()))
+    responses = dst[ys, xs]
+    order = np.argsort(-responses)[:max_points]
+    return [cv2.KeyPoint(float(xs[i]), float(ys[i]), float(nms_size), -1, float(responses[i]))
+            for i in order]
+
+
+def suppress_keypoints(keypoints, budget=None, radius=4.0):
+    # Жадное подавление немаксимумов: точки берутся по убыванию отклика,
+    # точка отбрасывается, если рядом уже есть более сильная
+    keypoints = sorted(keypoints, key=lambda kp: kp.response, reverse=True)
+    kept, kept_pts = [], np.empty((len(keypoints), 2), dtype=np.float32)
+    r2 = radius * radius
+    for kp in keypoints:
+        if budget is not None and len(kept) >= budget:
+            break
+        pt = kp.pt
+        if kept:
+            d = kept_pts[:len(kept)] - pt
+            if np.min(d[:, 0] ** 2 + d[:, 1] ** 2) < r2:
+                continue
+        kept_pts[len(kept)] = pt
+        kept.append(kp)
+    return kept
+
+
+def _detect_tile(gray, detector_type, core, overlap, budget, nms_radius):
+    h, w = gray.shape
+    cx0, cy0, cx1, cy1 = core
+    x0, y0 = max(0, cx0 - overlap), max(0, cy0 - overlap)
+    x1, y1 = min(w, cx1 + overlap), min(h, cy1 + overlap)
+    tile = gray[y0:y1, x0:x1]
+    if detector_type == "Harris":
+        # Порог считается по тайлу, а не по всему изображению
+        found = harris_keypoints(tile)
+    else:
+        found = create_detector(detector_type).detect(tile, None)
+    keypoints = []
+    for kp in found:
+        x, y = kp.pt[0] + x0, kp.pt[1] + y0
+        # Точка принадлежит тому тайлу, в ядро которого попадает - так
+        # точки из зон перекрытия не дублируются
+        if cx0 <= x < cx1 and cy0 <= y < cy1:
+            kp.pt = (x, y)
+            keypoints.append(kp)
+    return suppress_keypoints(keypoints, budget, nms_radius)
+
+
+def detect_keypoints_tiled(gray, detector_type, grid=(4, 4), overlap=32, per_cell=250,
+                           nms_radius=4.0, workers=None):
+    # Поиск ключевых точек по сетке перекрывающихся тайлов в нескольких потоках
+    # (OpenCV отпускает GIL). Перекрытие даёт детектору контекст у границ,
+    # бюджет на ячейку распределяет точки равномерно по изображению
+    h, w = gray.shape
+    cols, rows = grid
+    xs = np.linspace(0, w, cols + 1).astype(int)
+    ys = np.linspace(0, h, rows + 1).astype(int)
+    cores = [(xs[c], ys[r], xs[c + 1], ys[r + 1]) for r in range(rows) for c in range(cols)
+             if xs[c + 1] > xs[c] and ys[r + 1] > ys[r]]
+    with futures.ThreadPoolExecutor(max_workers=workers or min(len(cores), os.cpu_count() or 1)) as pool:
+        tiles = list(pool.map(lambda core: _detect_tile(gray, detector_type, core, overlap,
+                                                        per_cell, nms_radius), cores))
+    keypoints = [kp for tile in tiles for kp in tile]
+
+    # Точки по разные стороны границы тайлов могут оказаться ближе радиуса
+    # подавления - для них подавление повторяется глобально
+    inner_x, inner_y = xs[1:-1], ys[1:-1]
+
+    def near_border(kp):
+        x, y = kp.pt
+        return ((len(inner_x) and np.min(np.abs(inner_x - x)) < nms_radius) or
+                (len(inner_y) and np.min(np.abs(inner_y - y)) < nms_radius))
+
+    border = [kp for kp in keypoints if near_border(kp)]
+    inner = [kp for kp in keypoints if not near_border(kp)]
+    return inner + suppress_keypoints(border, radius=nms_radius)
+
+
+def detect_points(gray, detector_type, max_points=500):
+    # Точки для отслеживания в формате calcOpticalFlowPyrLK (N x 1 x 2, float32)
+    if detector_type == "Harris":
+        pts = cv2.goodFeaturesToTrack(gray, max_points, 0.01, 7, useHarrisDetector=True)
+        return pts if pts is not None else np.empty((0, 1, 2), dtype=np.float32)
+    keypoints = create_detector(detector_type).detect(gray, None)
+    keypoints = sorted(keypoints, key=lambda kp: kp.response, reverse=True)[:max_points]
+    return np.float32([kp.pt for kp in keypoints]).reshape(-1, 1, 2)
+
+
+class KeypointTracker:
+    # Детектор запускается раз в redetect_every кадров или когда доля
+    # сохранившихся треков падает ниже min_track_ratio; между запусками точки
+    # переносятся пирамидальным оптическим потоком Лукаса-Канаде с проверкой
+    # "вперёд-назад": точка остаётся, если обратный поток возвращает её на место
+    LK_PARAMS = dict(winSize=(21, 21), maxLevel=3)
+    # Для p95 хранятся задержки только последних кадров, остальное - суммами
+    LATENCY_WINDOW = 1000
+
+    def __init__(self, detector_type, redetect_every=30, min_track_ratio=0.5,
+                 max_points=500, fb_threshold=1.0):
+        self.detector_type = detector_type
+        self.redetect_every = redetect_every
+        self.min_track_ratio = min_track_ratio
+        self.max_points = max_points
+        self.fb_threshold = fb_threshold
+        self.lk_params = dict(self.LK_PARAMS,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01))
+        self.prev_gray = None
+        self.points = None
+        self.detected_count = 0
+        self.frames_since_detect = 0
+        self.latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self.frame_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.track_total = 0
+        self.detections = 0
+
+    def detect(self, gray):
+        self.points = detect_points(gray, self.detector_type, self.max_points)
+        self.detected_count = len(self.points)
+        self.frames_since_detect = 0
+        self.detections += 1
+
+    def track(self, gray):
+        self.frames_since_detect += 1
+        if not len(self.points):
+            return
+        p1, st, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None,
+                                             **self.lk_params)
+        p0r, st_back, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, p1, None,
+                                                   **self.lk_params)
+        fb_error = np.abs(self.points - p0r).reshape(-1, 2).max(axis=1)
+        good = (st.ravel() == 1) & (st_back.ravel() == 1) & (fb_error < self.fb_threshold)
+        self.points = p1[good]
+
+    def process(self, frame):
+        # Возвращает (точки, был ли запуск детектора, задержка в секундах)
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        detected = False
+        if self.points is None or self.frames_since_detect >= self.redetect_every:
+            self.detect(gray)
+            detected = True
+        else:
+            self.track(gray)
+            # Пустой набор точек (например, после чёрного кадра) - тоже потеря
+            # качества: иначе детектор не запускался бы до конца видео
+            if not len(self.points) or len(self.points) < self.min_track_ratio * self.detected_count:
+                self.detect(gray)
+                detected = True
+        self.prev_gray = gray
+        latency = time.perf_counter() - start
+        self.latencies.append(latency)
+        self.frame_count += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.track_total += len(self.points)
+        return self.points, detected, latency
+
+    def summary(self):
+        if not self.frame_count:
+            return "Кадры не обработаны"
+        n = self.frame_count
+        p95 = np.percentile(np.array(self.latencies), 95) * 1000
+        return (f"{self.detector_type}: {n} кадров, запусков детектора {self.detections}, "
+                f"задержка средняя {self.latency_total / n * 1000:.1f} мс, "
+                f"p95 (последние {len(self.latencies)} кадров) {p95:.1f} мс, "
+                f"максимум {self.latency_max * 1000:.1f} мс, треков в среднем {self.track_total / n:.0f}")
+
+
+def draw_tracks(frame, points, detected, latency):
+    out = frame.copy()
+    for x, y in points.reshape(-1, 2):
+        cv2.circle(out, (int(x), int(y)), 3, (0, 255, 0), -1)
+    text = f"{latency * 1000:.1f} ms, {len(points)} tracks" + (" (detect)" if detected else "")
+    cv2.putText(out, text, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    return out
+
+
+def track_video_headless(path, detector_type, redetect_every=30):
+    # Отслеживание точек без окна: построчный отчёт по кадрам и итог
+    tracker = KeypointTracker(detector_type, redetect_every)
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Не удалось открыть видео: {path}")
+    print("кадр,задержка_мс,треков,детектор")
+    index = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        points, detected, latency = tracker.process(frame)
+        print(f"{index},{latency * 1000:.2f},{len(points)},{int(detected)}")
+        index += 1
+    cap.release()
+    print(tracker.summary())
+    return tracker
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def list_image_files(folder):
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def ratio_test_matches(des1, des2, matcher=None, ratio=0.75):
+    # Правило Лоу: совпадение принимается, если ближайший сосед заметно
+    # ближе второго по близости
+    matcher = matcher or cv2.BFMatcher()
+    matches = matcher.knnMatch(des1, des2, k=2)
+    return [pair[0] for pair in matches
+            if len(pair) == 2 and pair[0].distance < ratio * pair[1].distance]
+
+
+class VisualWordIndex:
+    # Мешок визуальных слов с инвертированным индексом: дескрипторы SIFT
+    # квантуются по словарю (k-means), изображения описываются векторами TF-IDF,
+    # а кандидаты на сходство ищутся только по общим словам.
+    # Слишком частые слова (встречаются в большой доле изображений) отбрасываются -
+    # они почти не различают изображения, зато удлиняют списки индекса.
+    # Слово, общее не более чем для min_stop_df изображений, не отбрасывается
+    # никогда: в маленькой коллекции иначе пропали бы все пары дубликатов.
+    def __init__(self, vocabulary_size=1000, sample_size=100000, stop_fraction=0.25, seed=0,
+                 min_stop_df=2):
+        self.vocabulary_size = vocabulary_size
+        self.sample_size = sample_size
+        self.stop_fraction = stop_fraction
+        self.min_stop_df = min_stop_df
+        self.seed = seed
+        self.vocabulary = None
+        self.image_words = []    # для каждого изображения: номера слов
+        self.image_weights = []  # и их веса TF-IDF (вектор нормирован)
+        self.postings = None     # номера изображений, отсортированные по словам
+        self.posting_weights = None
+        self.offsets = None      # начало списка каждого слова в postings
+
+    def vocabulary_key(self, descriptor_keys):
+        # Ключ словаря в кэше: набор записей дескрипторов и параметры k-means.
+        # None, если хотя бы у одного изображения нет записи в кэше
+        if not descriptor_keys or any(key is None for key in descriptor_keys):
+            return None
+        text = json.dumps([sorted(descriptor_keys), self.vocabulary_size, self.sample_size, self.seed])
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def set_vocabulary(self, centers):
+        self.vocabulary = centers
+        self.matcher = cv2.BFMatcher(cv2.NORM_L2)
+
+    def build_vocabulary(self, descriptors):
+        rng = np.random.default_rng(self.seed)
+        available = [d for d in descriptors if d is not None and len(d)]
+        total = sum(len(d) for d in available)
+        fraction = min(1.0, self.sample_size / max(total, 1))
+        sample = [d[rng.random(len(d)) < fraction] for d in available]
+        sample = np.vstack(sample).astype(np.float32) if sample else np.zeros((0, 128), np.float32)
+        if not len(sample):
+            # Ни на одном изображении нет особых точек - пустой словарь
+            self.set_vocabulary(sample)
+            return
+        # Не меньше ~8 дескрипторов на слово: при словаре размером с выборку
+        # каждый дескриптор становится своим словом и общих слов нет вовсе
+        k = max(1, min(self.vocabulary_size, len(sample) // 8))
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1.0)
+        cv2.setRNGSeed(self.seed)
+        _, _, centers = cv2.kmeans(sample, k, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+        self.set_vocabulary(centers)
+
+    def quantize(self, des):
+        if des is None or not len(des) or not len(self.vocabulary):
+            return np.zeros(0, dtype=np.int64)
+        matches = self.matcher.match(des.astype(np.float32), self.vocabulary)
+        return np.fromiter((m.trainIdx for m in matches), dtype=np.int64, count=len(matches))
+
+    def build(self, descriptors, descriptor_keys=None):
+        # descriptor_keys - ключи записей дескрипторов в descriptor_cache: по ним
+        # словарь сохраняется рядом с кэшем и при повторном запуске на том же
+        # наборе изображений не строится заново (k-means - самая долгая часть)
+        if self.vocabulary is None:
+            key = self.vocabulary_key(descriptor_keys)
+            centers = descriptor_cache.load_vocabulary(key) if key else None
+            if centers is not None:
+                self.set_vocabulary(centers)
+            else:
+                self.build_vocabulary(descriptors)
+                if key and len(self.vocabulary):
+                    descriptor_cache.store_vocabulary(key, self.vocabulary)
+        k = len(self.vocabulary)
+        counts = [np.bincount(self.quantize(des), minlength=k) for des in descriptors]
+
+        n = len(counts)
+        df = np.zeros(k, dtype=np.int64)
+        for c in counts:
+            df += c > 0
+        # Сглаженный IDF: слово, которое есть во всех изображениях, сохраняет
+        # небольшой вес (при n = 2 общее слово пары иначе имело бы вес 0)
+        idf = np.log((n + 1) / np.maximum(df, 1))
+        idf[df > max(self.min_stop_df, self.stop_fraction * n)] = 0.0
+
+        self.image_words, self.image_weights = [], []
+        all_words, all_images, all_weights = [], [], []
+        for image_id, c in enumerate(counts):
+            vector = c * idf
+            words = np.flatnonzero(vector)
+            weights = vector[words]
+            norm = np.linalg.norm(weights)
+            if norm > 0:
+                weights = weights / norm
+            self.image_words.append(words)
+            self.image_weights.append(weights)
+            all_words.append(words)
+            all_images.append(np.full(len(words), image_id, dtype=np.int64))
+            all_weights.append(weights)
+
+        words = np.concatenate(all_words) if all_words else np.zeros(0, dtype=np.int64)
+        order = np.argsort(words, kind="stable")
+        self.postings = np.concatenate(all_images)[order]
+        self.posting_weights = np.concatenate(all_weights)[order]
+        self.offsets = np.searchsorted(words[order], np.arange(k + 1))
+        return self
+
+    def query(self, image_id, top_k=5):
+        # Косинусное сходство с остальными изображениями через общие слова
+        ids, scores = [], []
+        for word, weight in zip(self.image_words[image_id], self.image_weights[image_id]):
+            start, end = self.offsets[word], self.offsets[word + 1]
+            ids.append(self.postings[start:end])
+            scores.append(weight * self.posting_weights[start:end])
+        if not ids:
+            return []
+        candidates, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        totals[candidates == image_id] = -1.0
+        best = np.argsort(-totals)[:top_k]
+        return [(int(candidates[b]), float(totals[b])) for b in best if totals[b] > 0]
+
+    def similar_pairs(self, top_k=5):
+        pairs = {}
+        for i in range(len(self.image_words)):
+            for j, score in self.query(i, top_k):
+                key = (min(i, j), max(i, j))
+                pairs[key] = max(score, pairs.get(key, 0.0))
+        return sorted(((i, j, score) for (i, j), score in pairs.items()),
+                      key=lambda p: p[2], reverse=True)
+
+
+# Флаги уменьшенного декодирования (JPEG декодируется сразу в уменьшенном виде)
+REDUCED_GRAYSCALE_FLAGS = {
+    1: "IMREAD_GRAYSCALE",
+    2: "IMREAD_REDUCED_GRAYSCALE_2",
+    4: "IMREAD_REDUCED_GRAYSCALE_4",
+    8: "IMREAD_REDUCED_GRAYSCALE_8",
+}
+
+# Детектор SIFT процесса-обработчика (создаётся один раз на процесс)
+_worker_sift = None
+
+
+def _init_feature_worker(nfeatures):
+    global _worker_sift
+    cv2.setNumThreads(1)
+    # Каждое изображение обработчик читает один раз, поэтому держать их в памяти
+    # процесса незачем; повторные запуски ускоряет только сброс кэша на диск
+    decoded_images.max_bytes = 0
+    _worker_sift = cv2.SIFT_create(nfeatures=nfeatures or 0)
+
+
+def read_gray_reduced(path, reduce=1, max_side=None):
+    # Чтение в оттенках серого с уменьшением; возвращает изображение и
+    # коэффициенты (sx, sy) для пересчёта координат к исходному разрешению
+    img = decoded_images.read(path, getattr(cv2, REDUCED_GRAYSCALE_FLAGS[reduce]))
+    if img is None:
+        return None, (1.0, 1.0)
+    sx = sy = float(reduce)
+    h, w = img.shape
+    if max_side and max(h, w) > max_side:
+        ratio = max_side / max(h, w)
+        new_w, new_h = max(1, int(round(w * ratio))), max(1, int(round(h * ratio)))
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+        sx *= w / new_w
+        sy *= h / new_h
+    return img, (sx, sy)
+
+
+def extract_features(path, reduce=1, max_side=None, nfeatures=None):
+    # Ключевые точки (в виде массива) и дескрипторы SIFT одного изображения.
+    # nfeatures ограничивает число точек - SIFT оставляет самые сильные
+    sift = _worker_sift or cv2.SIFT_create(nfeatures=nfeatures or 0)
+    img, (sx, sy) = read_gray_reduced(path, reduce, max_side)
+    if img is None:
+        return np.empty((0, 7), dtype=np.float32), None
+    keypoints, descriptors = sift.detectAndCompute(img, None)
+    kp = keypoints_to_array(keypoints)
+    if sx != 1.0 or sy != 1.0:
+        kp[:, 0] *= sx
+        kp[:, 1] *= sy
+        kp[:, 2] *= (sx + sy) / 2
+    return kp, descriptors
+
+
+def _extract_features_task(args):
+    path, reduce, max_side, nfeatures = args
+    params = {"detector": "SIFT", "nfeatures": nfeatures or 0, "reduce": reduce,
+              "max_side": max_side or 0}
+
+    def compute():
+        kp, des = extract_features(path, reduce, max_side, nfeatures)
+        return array_to_keypoints(kp), des
+
+    keypoints, descriptors = descriptor_cache.get_or_compute(path, params, compute)
+    if descriptors is not None:
+        descriptors = np.ascontiguousarray(descriptors)
+    return keypoints_to_array(keypoints), descriptors, descriptor_cache.entry_key(path, params)
+
+
+def extract_features_parallel(paths, workers=None, reduce=1, max_side=None, nfeatures=None,
+                              with_keys=False):
+    # Параллельное извлечение признаков пулом процессов, один SIFT на процесс.
+    # Возвращает список (keypoints, descriptors) в порядке paths; with_keys -
+    # (keypoints, descriptors, ключ записи в descriptor_cache или None)
+    tasks = [(path, reduce, max_side, nfeatures) for path in paths]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, min(16, len(tasks) // (workers * 4)))
+    with futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_feature_worker,
+                             initargs=(nfeatures,)) as pool:
+        results = list(pool.map(_extract_features_task, tasks, chunksize=chunksize))
+    if with_keys:
+        return [(array_to_keypoints(kp), des, key) for kp, des, key in results]
+    return [(array_to_keypoints(kp), des) for kp, des, _ in results]
+
+
+def compute_sift_descriptors(paths, nfeatures=500, **options):
+    # Дескрипторы изображений и ключи их записей в descriptor_cache
+    results = extract_features_parallel(paths, nfeatures=nfeatures, with_keys=True, **options)
+    return [des for _, des, _ in results], [key for _, _, key in results]
+
+
+# До такого числа изображений правилом Лоу проверяются все пары: индекс
+# по нескольким изображениям слишком мал, чтобы надёжно отбирать кандидатов
+EXHAUSTIVE_MAX_IMAGES = 10
+
+
+def find_similar_pairs(paths, top_k=5, verify_top=20, extract_options=None, **index_options):
+    # Поиск самых похожих пар в большой коллекции: индекс визуальных слов
+    # отбирает кандидатов, а правило Лоу проверяет только verify_top лучших пар.
+    # extract_options передаются в extract_features_parallel (workers, reduce,
+    # max_side, nfeatures). Результат: (i, j, сходство по индексу, число совпадений)
+    descriptors, keys = compute_sift_descriptors(paths, **(extract_options or {}))
+    index = VisualWordIndex(**index_options).build(descriptors, keys)
+    n = len(paths)
+    if n <= EXHAUSTIVE_MAX_IMAGES:
+        scores = {(i, j): score for i, j, score in index.similar_pairs(n)}
+        candidates = [(i, j, scores.get((i, j), 0.0)) for i in range(n) for j in range(i + 1, n)]
+    else:
+        candidates = index.similar_pairs(top_k)[:verify_top]
+
+    matcher = cv2.BFMatcher()
+    verified = []
+    for i, j, score in candidates:
+        if descriptors[i] is None or descriptors[j] is None:
+            continue
+        good = ratio_test_matches(descriptors[i], descriptors[j], matcher)
+        verified.append((i, j, score, len(good)))
+    verified.sort(key=lambda p: (p[3], p[2]), reverse=True)
+    return verified
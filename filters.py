@@ -0,0 +1,53 @@
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+
+
+# Фильтры лабораторной 4 без интерфейса (см. lab_4)
+
+def apply_sharpen(image):
+    kernel = np.array([[-1, -1, -1],
+                      [-1,  9, -1],
+                      [-1, -1, -1]])
+    return cv2.filter2D(image, -1, kernel)
+
+
+def apply_motion_blur(image, size):
+    # Горизонтальное размытие в движении ядром size x size
+    kernel = np.zeros((size, size))
+    kernel[int((size-1)/2), :] = np.ones(size)
+    kernel /= size
+    return cv2.filter2D(image, -1, kernel)
+
+
+def apply_emboss(image):
+    kernel = np.array([[0, -1, -1],
+                      [1,  0, -1],
+                      [1,  1,  0]])
+    return cv2.filter2D(image, -1, kernel) + 128
+
+
+def apply_median(image, size):
+    return cv2.medianBlur(image, size)
+
+
+def apply_canny(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(gray, 100, 200)
+    return cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+
+
+def apply_roberts(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    
+    kernel_x = np.array([[1, 0], [0, -1]])
+    kernel_y = np.array([[0, 1], [-1, 0]])
+    
+    grad_x = cv2.filter2D(gray, cv2.CV_64F, kernel_x)
+    grad_y = cv2.filter2D(gray, cv2.CV_64F, kernel_y)
+    
+    grad = np.sqrt(grad_x**2 + grad_y**2)
+    grad = np.uint8(grad / grad.max() * 255)
+    
+    return cv2.cvtColor(grad, cv2.COLOR_GRAY2BGR)
@@ -0,0 +1,70 @@
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+
+
+# Обработка изображений лабораторной 2 без интерфейса: окно (lab_2),
+# benchmark.py и operations.py используют одни и те же функции
+
+def adjust_image_array(image, brightness, contrast, saturation):
+    # Яркость/контраст для любого изображения, насыщенность - только для цветного (RGB)
+    if len(image.shape) == 3:
+        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV).astype(np.float32)
+        h, s, v = cv2.split(hsv)
+        
+        saturation_factor = 1 + saturation / 100
+        s = np.clip(s * saturation_factor, 0, 255)
+        
+        hsv = cv2.merge([h, s, v])
+        image = cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2RGB)
+    
+    alpha = 1 + contrast / 100
+    beta = brightness
+    return cv2.convertScaleAbs(image, alpha=alpha, beta=beta)
+
+
+def linear_correction(image):
+    # Линейное растяжение гистограммы; None, если все пиксели одинаковые
+    img = image.astype(np.float32)
+    min_val = np.min(img)
+    max_val = np.max(img)
+    if min_val == max_val:
+        return None
+    img = 255 * (img - min_val) / (max_val - min_val)
+    return img.astype(np.uint8)
+
+
+def gamma_correction(image, gamma=1.5):
+    img = image.astype(np.float32) / 255.0
+    img = np.power(img, 1.0/gamma)
+    return (img * 255).astype(np.uint8)
+
+
+def compute_histograms(image, channel):
+    # Список (гистограмма, цвет линии) и подпись для выбранного канала
+    if len(image.shape) == 2:  # Grayscale
+        return [(cv2.calcHist([image], [0], None, [256], [0, 256]), 'gray')], "Gray"
+    if channel == "RGB":
+        colors = ('r', 'g', 'b')
+        return [(cv2.calcHist([image], [i], None, [256], [0, 256]), color)
+                for i, color in enumerate(colors)], "RGB"
+    channel_map = {"Red": 0, "Green": 1, "Blue": 2}
+    i = channel_map[channel]
+    return [(cv2.calcHist([image], [i], None, [256], [0, 256]), channel.lower()[0])], channel
+
+
+def plot_histogram(figure, image, channel, title):
+    figure.clear()
+    ax = figure.add_subplot(111)
+    
+    series, label = compute_histograms(image, channel)
+    if len(image.shape) == 2:  # Grayscale
+        # Столбцы из готовой гистограммы, без передачи всех пикселей в matplotlib
+        ax.hist(np.arange(256), bins=256, range=(0, 256), weights=series[0][0].ravel(), color='gray')
+    else:  # Color
+        for hist, color in series:
+            ax.plot(hist, color=color)
+    ax.set_title(f"{title} ({label})")
+    
+    ax.set_xlim([0, 256])
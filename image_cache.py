@@ -0,0 +1,178 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from lazy_imports import lazy_import
+from atomic_files import atomic_write
+
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+
+
+# Лимит памяти под декодированные изображения и каталог для сброса на диск.
+# Без LAB_IMAGE_CACHE_DIR изображения хранятся только в памяти процесса
+DEFAULT_MAX_BYTES = int(os.environ.get("LAB_IMAGE_CACHE_MB", "256")) * 1024 * 1024
+DEFAULT_SPILL_DIR = os.environ.get("LAB_IMAGE_CACHE_DIR") or None
+DEFAULT_SPILL_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+
+def decode_file(path, flags=None):
+    # cv2.imread не открывает пути с не-ASCII символами в Windows,
+    # поэтому файл читается в память и декодируется через imdecode
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError:
+        return None
+    if data.size == 0:
+        return None
+    return cv2.imdecode(data, cv2.IMREAD_COLOR if flags is None else flags)
+
+
+class DecodedImageCache:
+    # Кэш декодированных изображений. Ключ - (путь, mtime, размер, флаги
+    # декодирования), поэтому изменённый файл декодируется заново. В памяти
+    # хранится LRU, ограниченный суммарным размером массивов. Если задан
+    # spill_dir, каждое декодированное изображение дополнительно сохраняется
+    # как .npy и при следующем запуске (или в другом процессе) открывается
+    # через mmap вместо повторного декодирования. Возвращаемые массивы общие
+    # для всех вызывающих и доступны только для чтения
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, spill_dir=DEFAULT_SPILL_DIR,
+                 spill_max_bytes=DEFAULT_SPILL_MAX_BYTES, enabled=True):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.enabled = enabled and os.environ.get("LAB_IMAGE_CACHE", "1") != "0"
+        self.entries = OrderedDict()  # ключ -> массив, от давно использованных к свежим
+        self.bytes = 0
+        self.spill_size = None  # оценка занятого на диске места, считается при первой записи
+        self.hits = self.spill_hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, path, flags):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, flags)
+
+    def _spill_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.spill_dir, digest[:2], f"{digest}.npy")
+
+    def _remember(self, key, image):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.entries[key] = image
+            self.bytes += image.nbytes
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                _, old = self.entries.popitem(last=False)
+                self.bytes -= old.nbytes
+        return image
+
+    def _load_spilled(self, key):
+        path = self._spill_path(key)
+        try:
+            image = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        # Обычный ndarray поверх отображения, чтобы результаты операций не были memmap
+        return image.view(np.ndarray)
+
+    def _spill(self, key, image):
+        path = self._spill_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as f:
+            np.save(f, image)
+        with self.lock:
+            if self.spill_size is None:
+                self.spill_size = self._scan_spill()
+            else:
+                self.spill_size += os.path.getsize(path)
+            if self.spill_size > self.spill_max_bytes:
+                self.evict_spilled()
+
+    def _spilled_files(self):
+        files = []
+        if not os.path.isdir(self.spill_dir):
+            return files
+        for shard in os.scandir(self.spill_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".npy"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _scan_spill(self):
+        return sum(size for _, size, _ in self._spilled_files())
+
+    def evict_spilled(self):
+        # Удаление давно не открывавшихся файлов, пока не останется 90% лимита.
+        # Уже отображённые в память файлы остаются доступны после удаления
+        files = sorted(self._spilled_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.spill_max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.spill_size = total
+
+    def get_or_decode(self, path, flags, decode):
+        # decode() вызывается только при промахе; None (ошибка чтения) не кэшируется
+        if not self.enabled:
+            return decode()
+        try:
+            key = self.key(path, flags)
+        except OSError:
+            return decode()
+
+        with self.lock:
+            image = self.entries.get(key)
+            if image is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return image
+
+        if self.spill_dir:
+            image = self._load_spilled(key)
+            if image is not None:
+                self.spill_hits += 1
+                return self._remember(key, image)
+
+        image = decode()
+        if image is None:
+            return None
+        self.misses += 1
+        image.setflags(write=False)
+        if self.spill_dir:
+            try:
+                self._spill(key, image)
+            except OSError as e:
+                print(f"Не удалось сохранить изображение в кэш: {e}")
+        return self._remember(key, image)
+
+    def read(self, path, flags=None):
+        # flags - флаги cv2.imdecode, по умолчанию IMREAD_COLOR
+        if flags is None:
+            flags = cv2.IMREAD_COLOR
+        return self.get_or_decode(path, flags, lambda: decode_file(path, flags))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+
+# Общий экземпляр для лабораторных работ
+decoded_images = DecodedImageCache()
@@ -0,0 +1,114 @@
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QFileDialog
+from lazy_imports import lazy_import
+from image_cache import decoded_images
+
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+
+
+IMAGE_FILTER = "Image Files (*.png *.jpg *.jpeg *.bmp)"
+
+# Format_BGR888 появился в Qt 5.14; в более старых версиях цветные кадры
+# OpenCV приходится переставлять в RGB (это единственный случай с копией)
+HAS_BGR888 = hasattr(QImage, "Format_BGR888")
+
+# Число сохраняемых масштабированных копий на одну метку
+SCALED_CACHE_SIZE = 4
+
+
+def read_image(path, flags=None):
+    # Повторное чтение того же файла берётся из кэша декодированных изображений;
+    # результат доступен только для чтения
+    return decoded_images.read(path, flags)
+
+
+def open_image(parent, title="Открыть изображение", file_filter=IMAGE_FILTER, flags=None):
+    # Диалог выбора файла и чтение изображения; (None, None), если выбор отменён
+    # или файл не удалось декодировать
+    path, _ = QFileDialog.getOpenFileName(parent, title, "", file_filter)
+    if not path:
+        return None, None
+    image = read_image(path, flags)
+    if image is None:
+        return None, None
+    return path, image
+
+
+def numpy_to_qimage(image, order="BGR"):
+    # QImage поверх буфера массива без копирования. QImage не владеет данными,
+    # поэтому массив должен жить, пока жив QImage (см. numpy_to_pixmap).
+    # order - порядок каналов цветного изображения: "BGR" (OpenCV) или "RGB"
+    if image.dtype != np.uint8:
+        image = np.clip(image, 0, 255).astype(np.uint8)
+    if image.ndim == 3 and image.shape[2] == 1:
+        image = image[:, :, 0]
+
+    if image.ndim == 2:
+        fmt = QImage.Format_Grayscale8
+        channels = 1
+    elif image.shape[2] == 3:
+        channels = 3
+        if order == "RGB":
+            fmt = QImage.Format_RGB888
+        elif HAS_BGR888:
+            fmt = QImage.Format_BGR888
+        else:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            fmt = QImage.Format_RGB888
+    elif image.shape[2] == 4:
+        channels = 4
+        # BGRA в памяти совпадает с ARGB32 на little-endian машинах
+        fmt = QImage.Format_RGBA8888 if order == "RGB" else QImage.Format_ARGB32
+    else:
+        raise ValueError(f"Неподдерживаемое число каналов: {image.shape[2]}")
+
+    # Строки могут идти с произвольным шагом (срез большего массива), но
+    # пиксели внутри строки должны лежать подряд, а строки - не перекрываться
+    if (image.strides[-1] != 1 or (channels > 1 and image.strides[1] != channels)
+            or image.strides[0] < image.shape[1] * channels):
+        image = np.ascontiguousarray(image)
+
+    h, w = image.shape[:2]
+    qimage = QImage(image.ctypes.data, w, h, image.strides[0], fmt)
+    # Ссылка на массив не даёт сборщику мусора освободить буфер
+    qimage.ndarray = image
+    return qimage
+
+
+def numpy_to_pixmap(image, order="BGR"):
+    # QPixmap.fromImage копирует данные, после этого массив можно освобождать
+    return QPixmap.fromImage(numpy_to_qimage(image, order))
+
+
+def set_label_image(label, image, order="BGR", scaled=True):
+    # Показ изображения в QLabel. Пиксмап исходного размера строится один раз
+    # для каждого нового массива, а масштабированные копии кэшируются по размеру
+    # метки, поэтому повторный показ того же изображения не пересчитывает
+    # ни преобразование, ни сглаживающее масштабирование. Массивы, изменённые
+    # на месте, нужно передавать копией или вызывать clear_label_image
+    cache = getattr(label, "image_cache", None)
+    if cache is None or cache["image"] is not image or cache["order"] != order:
+        cache = {"image": image, "order": order, "pixmap": numpy_to_pixmap(image, order), "scaled": {}}
+        label.image_cache = cache
+
+    if not scaled:
+        label.setPixmap(cache["pixmap"])
+        return
+
+    size = (label.width(), label.height())
+    pixmap = cache["scaled"].get(size)
+    if pixmap is None:
+        if len(cache["scaled"]) >= SCALED_CACHE_SIZE:
+            cache["scaled"].pop(next(iter(cache["scaled"])))
+        pixmap = cache["pixmap"].scaled(size[0], size[1], Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        cache["scaled"][size] = pixmap
+    label.setPixmap(pixmap)
+
+
+def clear_label_image(label, text=""):
+    label.image_cache = None
+    label.clear()
+    if text:
+        label.setText(text)
@@ -1,8 +1,18 @@
-import tkinter as tk
-from tkinter import filedialog, ttk
-from PIL import Image, ImageTk
+from PIL import Image
 import os
-import math
+import sys
+import argparse
+from lazy_imports import lazy_import
+from startup_time import exit_after_startup
+from color_models import (rgb_to_cmyk, rgb_to_hsl, rgb_to_hsv, rgb_to_lab, rgb_to_ycbcr,
+                          resize_for_display, batch_color_stats, STATS_MAX_PIXELS)
+
+# Tk is only loaded when the viewer is created, so --stats also runs without Tk
+tk = lazy_import("tkinter")
+ttk = lazy_import("tkinter.ttk")
+filedialog = lazy_import("tkinter.filedialog")
+ImageTk = lazy_import("PIL.ImageTk")
+
 
 class ImageViewerApp:
     def __init__(self, root):
@@ -99,12 +109,8 @@ class ImageViewerApp:
             # Calculate display size while maintaining aspect ratio
             canvas_width = self.image_frame.winfo_width() - 20
             canvas_height = self.image_frame.winfo_height() - 20
-            img_width, img_height = self.image.size
-            
-            ratio = min(canvas_width/img_width, canvas_height/img_height)
-            new_size = (int(img_width * ratio), int(img_height * ratio))
-            
-            resized_image = self.image.resize(new_size, Image.LANCZOS)
+            resized_image = resize_for_display(self.image, canvas_width, canvas_height)
+            new_size = resized_image.size
             self.tk_image = ImageTk.PhotoImage(resized_image)
 
             self.canvas.delete("all")
@@ -177,27 +183,27 @@ class ImageViewerApp:
         self.update_color_box("RGB", f"#{r:02x}{g:02x}{b:02x}", rgb_text)
 
         # CMYK
-        c, m, y, k = self.rgb_to_cmyk(r, g, b)
+        c, m, y, k = rgb_to_cmyk(r, g, b)
         cmyk_text = f"{c:.2f}, {m:.2f}, {y:.2f}, {k:.2f}"
         self.update_color_box("CMYK", f"#{r:02x}{g:02x}{b:02x}", cmyk_text)
 
         # HSL
-        h, s, l = self.rgb_to_hsl(r, g, b)
+        h, s, l = rgb_to_hsl(r, g, b)
         hsl_text = f"{h:.1f}°, {s:.1%}, {l:.1%}"
         self.update_color_box("HSL", f"#{r:02x}{g:02x}{b:02x}", hsl_text)
 
         # HSV
-        h, s, v = self.rgb_to_hsv(r, g, b)
+        h, s, v = rgb_to_hsv(r, g, b)
         hsv_text = f"{h:.1f}°, {s:.1%}, {v:.1%}"
         self.update_color_box("HSV", f"#{r:02x}{g:02x}{b:02x}", hsv_text)
 
         # LAB (simplified)
-        l, a, b_lab = self.rgb_to_lab(r, g, b)
+        l, a, b_lab = rgb_to_lab(r, g, b)
         lab_text = f"{l:.1f}, {a:.1f}, {b_lab:.1f}"
         self.update_color_box("LAB", f"#{r:02x}{g:02x}{b:02x}", lab_text)
 
         # YCbCr
-        y, cb, cr = self.rgb_to_ycbcr(r, g, b)
+        y, cb, cr = rgb_to_ycbcr(r, g, b)
         ycbcr_text = f"{y:.1f}, {cb:.1f}, {cr:.1f}"
         self.update_color_box("YCbCr", f"#{r:02x}{g:02x}{b:02x}", ycbcr_text)
 
@@ -218,70 +224,26 @@ class ImageViewerApp:
     def hide_tooltip(self, event=None):
         self.tooltip.place_forget()
 
-    # Color conversion functions
-    def rgb_to_cmyk(self, r, g, b):
-        if (r, g, b) == (0, 0, 0):
-            return 0, 0, 0, 1
-        c = 1 - r / 255
-        m = 1 - g / 255
-        y = 1 - b / 255
-        k = min(c, m, y)
-        c = (c - k) / (1 - k) if (1 - k) != 0 else 0
-        m = (m - k) / (1 - k) if (1 - k) != 0 else 0
-        y = (y - k) / (1 - k) if (1 - k) != 0 else 0
-        return c, m, y, k
-
-    def rgb_to_hsl(self, r, g, b):
-        r, g, b = r / 255, g / 255, b / 255
-        max_val = max(r, g, b)
-        min_val = min(r, g, b)
-        h = s = l = (max_val + min_val) / 2
-
-        if max_val != min_val:
-            d = max_val - min_val
-            s = d / (2 - max_val - min_val) if l > 0.5 else d / (max_val + min_val)
-            if max_val == r:
-                h = (g - b) / d + (6 if g < b else 0)
-            elif max_val == g:
-                h = (b - r) / d + 2
-            else:
-                h = (r - g) / d + 4
-            h /= 6
-        return round(h * 360, 1), round(s, 3), round(l, 3)
-
-    def rgb_to_hsv(self, r, g, b):
-        r, g, b = r / 255, g / 255, b / 255
-        max_val = max(r, g, b)
-        min_val = min(r, g, b)
-        h = s = v = max_val
-
-        d = max_val - min_val
-        s = 0 if max_val == 0 else d / max_val
-
-        if max_val != min_val:
-            if max_val == r:
-                h = (g - b) / d + (6 if g < b else 0)
-            elif max_val == g:
-                h = (b - r) / d + 2
-            else:
-                h = (r - g) / d + 4
-            h /= 6
-        return round(h * 360, 1), round(s, 3), round(v, 3)
-
-    def rgb_to_lab(self, r, g, b):
-        # Simplified conversion (accurate conversion requires XYZ space)
-        l = 0.2126 * r + 0.7152 * g + 0.0722 * b
-        a = 1.4749 * (0.2215 * r - 0.3390 * g + 0.1175 * b) + 128
-        b_lab = 0.6245 * (0.1949 * r + 0.6057 * g - 0.8006 * b) + 128
-        return round(l / 2.55, 1), round(a - 128, 1), round(b_lab - 128, 1)
-
-    def rgb_to_ycbcr(self, r, g, b):
-        y = 0.299 * r + 0.587 * g + 0.114 * b
-        cb = 128 - 0.168736 * r - 0.331264 * g + 0.5 * b
-        cr = 128 + 0.5 * r - 0.418688 * g - 0.081312 * b
-        return round(y, 1), round(cb, 1), round(cr, 1)
-
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Image viewer with color models")
+    parser.add_argument("--stats", nargs="+", metavar="PATH",
+                        help="write color statistics of images (files or folders) instead of opening the viewer")
+    parser.add_argument("--out", default="color_stats.jsonl", help="JSON lines output for --stats")
+    parser.add_argument("--workers", type=int, help="number of processes for --stats")
+    parser.add_argument("--bins", type=int, default=32, help="bins per channel histogram")
+    parser.add_argument("--colors", type=int, default=5, help="number of dominant colors")
+    parser.add_argument("--max-pixels", type=int, default=STATS_MAX_PIXELS,
+                        help="pixels sampled per image")
+    args = parser.parse_args()
+
+    if args.stats:
+        from cli import walk_images
+        paths = (path for root_path in args.stats for path in walk_images(root_path))
+        _, failed = batch_color_stats(paths, args.out, args.workers, bins=args.bins,
+                                      colors=args.colors, max_pixels=args.max_pixels)
+        sys.exit(1 if failed else 0)
+
     root = tk.Tk()
     app = ImageViewerApp(root)
+    exit_after_startup(root.destroy, root.after_idle)
     root.mainloop()
\ No newline at end of file
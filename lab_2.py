@@ -1,12 +1,14 @@
 import sys
-import cv2
-import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel, QPushButton, 
-                             QVBoxLayout, QHBoxLayout, QFileDialog, QSlider, QComboBox)
-from PyQt5.QtGui import QPixmap, QImage
+                             QVBoxLayout, QHBoxLayout, QSlider, QComboBox)
 from PyQt5.QtCore import Qt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+from lazy_imports import lazy_import
+from profiling import profiled, install_overlay
+from startup_time import exit_after_startup
+from image_core import open_image, set_label_image
+from image_adjust import adjust_image_array, linear_correction, gamma_correction, plot_histogram
+
+cv2 = lazy_import("cv2")
 
 
 class ImageProcessorApp(QMainWindow):
@@ -42,6 +44,7 @@ class ImageProcessorApp(QMainWindow):
         # Инициализация UI
         self.init_image_ui()
         self.init_control_ui()
+        install_overlay(self)
         
     def init_image_ui(self):
         self.original_label = QLabel("Original Image")
@@ -87,8 +90,14 @@ class ImageProcessorApp(QMainWindow):
         self.gamma_corr_button = QPushButton("Gamma Correction")
         self.gamma_corr_button.clicked.connect(self.apply_gamma_correction)
         
-        self.original_hist_canvas = FigureCanvas(Figure(figsize=(5, 3)))
-        self.processed_hist_canvas = FigureCanvas(Figure(figsize=(5, 3)))
+        # Холсты гистограмм создаются при первом построении (ensure_histogram_canvases),
+        # до этого на их месте пустые контейнеры
+        self.original_hist_canvas = None
+        self.processed_hist_canvas = None
+        self.original_hist_box = QWidget()
+        self.processed_hist_box = QWidget()
+        for box in (self.original_hist_box, self.processed_hist_box):
+            QVBoxLayout(box).setContentsMargins(0, 0, 0, 0)
         
         self.control_layout.addWidget(self.load_button)
         self.control_layout.addWidget(self.gray_button)
@@ -103,24 +112,33 @@ class ImageProcessorApp(QMainWindow):
         self.control_layout.addWidget(self.linear_corr_button)
         self.control_layout.addWidget(self.gamma_corr_button)
         self.control_layout.addWidget(QLabel("Original Histogram:"))
-        self.control_layout.addWidget(self.original_hist_canvas)
+        self.control_layout.addWidget(self.original_hist_box)
         self.control_layout.addWidget(QLabel("Processed Histogram:"))
-        self.control_layout.addWidget(self.processed_hist_canvas)
+        self.control_layout.addWidget(self.processed_hist_box)
+        
+    def ensure_histogram_canvases(self):
+        # matplotlib с Qt-бэкендом импортируется только здесь: это самая долгая
+        # часть запуска, а гистограммы нужны лишь после загрузки изображения
+        if self.original_hist_canvas is not None:
+            return
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+        self.original_hist_canvas = FigureCanvas(Figure(figsize=(5, 3)))
+        self.processed_hist_canvas = FigureCanvas(Figure(figsize=(5, 3)))
+        self.original_hist_box.layout().addWidget(self.original_hist_canvas)
+        self.processed_hist_box.layout().addWidget(self.processed_hist_canvas)
         
     def load_image(self):
-        file_name, _ = QFileDialog.getOpenFileName(self, "Open Image", "", 
-                                                  "Image Files (*.png *.jpg *.jpeg *.bmp)")
-        if file_name:
-            self.original_image = cv2.imread(file_name)
-            if self.original_image is not None:
-                self.original_image = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2RGB)
-                self.processed_image = self.original_image.copy()
-                self.base_image = self.original_image.copy()
-                self.gray_image = None
-                self.is_gray = False
-                self.display_images()
-                self.update_histograms()
-                self.reset_sliders()
+        _, image = open_image(self, "Open Image")
+        if image is not None:
+            self.original_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            self.processed_image = self.original_image.copy()
+            self.base_image = self.original_image.copy()
+            self.gray_image = None
+            self.is_gray = False
+            self.display_images()
+            self.update_histograms()
+            self.reset_sliders()
     
     def reset_sliders(self):
         self.brightness_slider.setValue(0)
@@ -128,29 +146,11 @@ class ImageProcessorApp(QMainWindow):
         self.saturation_slider.setValue(0)
     
     def display_images(self):
+        # Изображения хранятся в RGB; пиксмапы строятся без копирования данных
         if self.original_image is not None:
-            # Original image
-            h, w, ch = self.original_image.shape
-            bytes_per_line = ch * w
-            qimg = QImage(self.original_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            self.original_label.setPixmap(QPixmap.fromImage(qimg).scaled(
-                self.original_label.width(), self.original_label.height(), 
-                Qt.KeepAspectRatio, Qt.SmoothTransformation))
-            
-            # Processed image
+            set_label_image(self.original_label, self.original_image, "RGB")
             if self.processed_image is not None:
-                if len(self.processed_image.shape) == 2:  # Grayscale
-                    h, w = self.processed_image.shape
-                    bytes_per_line = w
-                    qimg = QImage(self.processed_image.data, w, h, bytes_per_line, QImage.Format_Grayscale8)
-                else:  # Color
-                    h, w, ch = self.processed_image.shape
-                    bytes_per_line = ch * w
-                    qimg = QImage(self.processed_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-                
-                self.processed_label.setPixmap(QPixmap.fromImage(qimg).scaled(
-                    self.processed_label.width(), self.processed_label.height(), 
-                    Qt.KeepAspectRatio, Qt.SmoothTransformation))
+                set_label_image(self.processed_label, self.processed_image, "RGB")
     
     def convert_to_gray(self):
         if self.original_image is not None:
@@ -160,6 +160,7 @@ class ImageProcessorApp(QMainWindow):
             self.display_images()
             self.update_histograms()
     
+    @profiled("lab_2.adjust_image")
     def adjust_image(self):
         if self.original_image is None:
             return
@@ -168,25 +169,10 @@ class ImageProcessorApp(QMainWindow):
         contrast = self.contrast_slider.value()
         saturation = self.saturation_slider.value()
         
-        if self.is_gray:
-            # Для серого изображения работаем только с яркостью и контрастом
-            self.processed_image = self.gray_image.copy()
-        else:
-            # Для цветного изображения применяем насыщенность
-            self.processed_image = self.base_image.copy()
-            hsv = cv2.cvtColor(self.processed_image, cv2.COLOR_RGB2HSV).astype(np.float32)
-            h, s, v = cv2.split(hsv)
-            
-            saturation_factor = 1 + saturation / 100
-            s = np.clip(s * saturation_factor, 0, 255)
-            
-            hsv = cv2.merge([h, s, v])
-            self.processed_image = cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2RGB)
-        
-        # Применяем яркость и контраст ко всем изображениям
-        alpha = 1 + contrast / 100
-        beta = brightness
-        self.processed_image = cv2.convertScaleAbs(self.processed_image, alpha=alpha, beta=beta)
+        # Для серого изображения работаем только с яркостью и контрастом,
+        # для цветного дополнительно применяем насыщенность
+        source = self.gray_image if self.is_gray else self.base_image
+        self.processed_image = adjust_image_array(source, brightness, contrast, saturation)
         
         self.display_images()
         self.update_histograms()
@@ -196,19 +182,12 @@ class ImageProcessorApp(QMainWindow):
             return
             
         # Линейная коррекция только для серых изображений
-        img = self.processed_image.astype(np.float32)
-        
-        # Находим минимальное и максимальное значения
-        min_val = np.min(img)
-        max_val = np.max(img)
+        corrected = linear_correction(self.processed_image)
         
         # Если все пиксели одинаковые, ничего не делаем
-        if min_val == max_val:
+        if corrected is None:
             return
-            
-        # Линейное растяжение гистограммы
-        img = 255 * (img - min_val) / (max_val - min_val)
-        self.processed_image = img.astype(np.uint8)
+        self.processed_image = corrected
         
         self.display_images()
         self.update_histograms()
@@ -219,9 +198,7 @@ class ImageProcessorApp(QMainWindow):
             
         # Гамма-коррекция только для серых изображений
         gamma = 1.5  # Можно сделать настраиваемым параметром
-        img = self.processed_image.astype(np.float32) / 255.0
-        img = np.power(img, 1.0/gamma)
-        self.processed_image = (img * 255).astype(np.uint8)
+        self.processed_image = gamma_correction(self.processed_image, gamma)
         
         self.display_images()
         self.update_histograms()
@@ -230,35 +207,16 @@ class ImageProcessorApp(QMainWindow):
         if self.original_image is None:
             return
             
+        self.ensure_histogram_canvases()
         channel = self.hist_channel.currentText()
         self.draw_histogram(self.original_image, self.original_hist_canvas, channel, "Original")
         
         if self.processed_image is not None:
             self.draw_histogram(self.processed_image, self.processed_hist_canvas, channel, "Processed")
     
+    @profiled("lab_2.draw_histogram")
     def draw_histogram(self, image, canvas, channel, title):
-        canvas.figure.clear()
-        ax = canvas.figure.add_subplot(111)
-        
-        if len(image.shape) == 2:  # Grayscale
-            ax.hist(image.ravel(), 256, [0, 256], color='gray')
-            ax.set_title(f"{title} (Gray)")
-        else:  # Color
-            if channel == "RGB":
-                colors = ('r', 'g', 'b')
-                for i, color in enumerate(colors):
-                    hist = cv2.calcHist([image], [i], None, [256], [0, 256])
-                    ax.plot(hist, color=color)
-                ax.set_title(f"{title} (RGB)")
-            else:
-                channel_map = {"Red": 0, "Green": 1, "Blue": 2}
-                i = channel_map[channel]
-                color = channel.lower()[0]
-                hist = cv2.calcHist([image], [i], None, [256], [0, 256])
-                ax.plot(hist, color=color)
-                ax.set_title(f"{title} ({channel})")
-        
-        ax.set_xlim([0, 256])
+        plot_histogram(canvas.figure, image, channel, title)
         canvas.draw()
 
 
@@ -266,4 +224,5 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = ImageProcessorApp()
     window.show()
+    exit_after_startup(app.quit)
     sys.exit(app.exec_())
\ No newline at end of file
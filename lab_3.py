@@ -1,10 +1,14 @@
 import sys
-import cv2
-import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel, 
-                             QPushButton, QFileDialog, QVBoxLayout, QHBoxLayout)
-from PyQt5.QtGui import QPixmap, QImage
+                             QPushButton, QVBoxLayout, QHBoxLayout)
 from PyQt5.QtCore import Qt
+from lazy_imports import lazy_import
+from profiling import profiled, install_overlay
+from startup_time import exit_after_startup
+from image_core import open_image, set_label_image, clear_label_image
+from morphology import morphology
+
+cv2 = lazy_import("cv2")
 
 
 class MorphologyApp(QMainWindow):
@@ -17,6 +21,7 @@ class MorphologyApp(QMainWindow):
         self.processed_image = None
         
         self.initUI()
+        install_overlay(self)
         
     def initUI(self):
         # Основной виджет и layout
@@ -72,56 +77,33 @@ class MorphologyApp(QMainWindow):
         main_layout.addLayout(right_panel, 50)
         
     def load_image(self):
-        file_name, _ = QFileDialog.getOpenFileName(self, "Открыть изображение", "", 
-                                                 "Image Files (*.png *.jpg *.jpeg *.bmp)")
-        if file_name:
-            self.image = cv2.imread(file_name)
-            if self.image is not None:
-                self.display_image(self.image, self.original_label)
-                self.processed_image = None
-                self.processed_label.clear()
-                self.processed_label.setText("Результат обработки")
+        _, image = open_image(self)
+        if image is not None:
+            self.image = image
+            self.display_image(self.image, self.original_label)
+            self.processed_image = None
+            clear_label_image(self.processed_label, "Результат обработки")
     
+    @profiled("lab_3.apply_morphology")
     def apply_morphology(self, operation):
         if self.image is None:
             return
             
-        # Создаем ядро для морфологических операций
-        kernel = np.ones((5, 5), np.uint8)
-        
-        if operation == cv2.MORPH_ERODE:
-            result = cv2.erode(self.image, kernel, iterations=1)
-        elif operation == cv2.MORPH_DILATE:
-            result = cv2.dilate(self.image, kernel, iterations=1)
-        elif operation == cv2.MORPH_OPEN:
-            result = cv2.morphologyEx(self.image, cv2.MORPH_OPEN, kernel)
-        elif operation == cv2.MORPH_CLOSE:
-            result = cv2.morphologyEx(self.image, cv2.MORPH_CLOSE, kernel)
-        elif operation == cv2.MORPH_GRADIENT:
-            result = cv2.morphologyEx(self.image, cv2.MORPH_GRADIENT, kernel)
-        else:
+        # Ядро 5x5 для морфологических операций
+        result = morphology(self.image, operation, 5)
+        if result is None:
             return
             
         self.processed_image = result
         self.display_image(result, self.processed_label)
     
     def display_image(self, image, label):
-        if len(image.shape) == 2:  # Ч/б изображение
-            qimage = QImage(image.data, image.shape[1], image.shape[0], 
-                           image.shape[1], QImage.Format_Grayscale8)
-        else:  # Цветное изображение
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            h, w, ch = rgb_image.shape
-            bytes_per_line = ch * w
-            qimage = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        
-        pixmap = QPixmap.fromImage(qimage)
-        label.setPixmap(pixmap.scaled(label.width(), label.height(), 
-                                     Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        set_label_image(label, image)
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MorphologyApp()
     window.show()
+    exit_after_startup(app.quit)
     sys.exit(app.exec_())
\ No newline at end of file
@@ -1,11 +1,14 @@
 import sys
-import cv2
-import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel, 
-                             QPushButton, QFileDialog, QVBoxLayout, QHBoxLayout, 
+                             QPushButton, QVBoxLayout, QHBoxLayout, 
                              QGridLayout, QSizePolicy, QFrame)
-from PyQt5.QtGui import QPixmap, QImage
 from PyQt5.QtCore import Qt
+from profiling import profiled, install_overlay
+from startup_time import exit_after_startup
+from image_core import open_image, set_label_image, clear_label_image
+from filters import (apply_sharpen, apply_motion_blur, apply_emboss, apply_median, apply_canny,
+                     apply_roberts)
+
 
 class ImageProcessingApp(QMainWindow):
     def __init__(self):
@@ -21,6 +24,7 @@ class ImageProcessingApp(QMainWindow):
         self.MEDIAN_FILTER_SIZE = 5  # размер для медианного фильтра (нечетное)
         
         self.initUI()
+        install_overlay(self)
         
     def initUI(self):
         # Основной виджет и layout
@@ -98,122 +102,81 @@ class ImageProcessingApp(QMainWindow):
         main_layout.addLayout(buttons_panel, 20)  # 20% пространства для кнопок
         
     def load_image(self):
-        file_name, _ = QFileDialog.getOpenFileName(self, "Открыть изображение", "", 
-                                                 "Image Files (*.png *.jpg *.jpeg *.bmp)")
-        if file_name:
-            self.original_image = cv2.imread(file_name)
-            if self.original_image is not None:
-                self.display_image(self.original_image, self.original_label)
-                self.processed_image = None
-                self.processed_label.clear()
-                self.processed_label.setText("Результат обработки")
+        _, image = open_image(self)
+        if image is not None:
+            self.original_image = image
+            self.display_image(self.original_image, self.original_label)
+            self.processed_image = None
+            clear_label_image(self.processed_label, "Результат обработки")
     
+    @profiled("lab_4.sharpen_image")
     def sharpen_image(self):
         if self.original_image is None:
             return
             
-        kernel = np.array([[-1, -1, -1],
-                          [-1,  9, -1],
-                          [-1, -1, -1]])
-        
-        sharpened = cv2.filter2D(self.original_image, -1, kernel)
+        sharpened = apply_sharpen(self.original_image)
         self.processed_image = sharpened
         self.display_image(sharpened, self.processed_label)
     
+    @profiled("lab_4.motion_blur")
     def motion_blur(self):
         if self.original_image is None:
             return
             
         # Фиксированный размер ядра для размытия в движении
-        size = self.MOTION_BLUR_SIZE
-        kernel = np.zeros((size, size))
-        kernel[int((size-1)/2), :] = np.ones(size)
-        kernel /= size
-        
-        motion_blurred = cv2.filter2D(self.original_image, -1, kernel)
+        motion_blurred = apply_motion_blur(self.original_image, self.MOTION_BLUR_SIZE)
         self.processed_image = motion_blurred
         self.display_image(motion_blurred, self.processed_label)
     
+    @profiled("lab_4.emboss_image")
     def emboss_image(self):
         if self.original_image is None:
             return
             
-        kernel = np.array([[0, -1, -1],
-                          [1,  0, -1],
-                          [1,  1,  0]])
-        
-        embossed = cv2.filter2D(self.original_image, -1, kernel) + 128
+        embossed = apply_emboss(self.original_image)
         self.processed_image = embossed
         self.display_image(embossed, self.processed_label)
     
+    @profiled("lab_4.median_filter")
     def median_filter(self):
         if self.original_image is None:
             return
             
         # Фиксированный размер медианного фильтра
-        size = self.MEDIAN_FILTER_SIZE
-        median_filtered = cv2.medianBlur(self.original_image, size)
+        median_filtered = apply_median(self.original_image, self.MEDIAN_FILTER_SIZE)
         self.processed_image = median_filtered
         self.display_image(median_filtered, self.processed_label)
     
+    @profiled("lab_4.canny_edge")
     def canny_edge(self):
         if self.original_image is None:
             return
             
-        gray = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(gray, 100, 200)
-        edges_rgb = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+        edges_rgb = apply_canny(self.original_image)
         self.processed_image = edges_rgb
         self.display_image(edges_rgb, self.processed_label)
     
+    @profiled("lab_4.roberts_edge")
     def roberts_edge(self):
         if self.original_image is None:
             return
             
-        gray = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2GRAY)
-        
-        kernel_x = np.array([[1, 0], [0, -1]])
-        kernel_y = np.array([[0, 1], [-1, 0]])
-        
-        grad_x = cv2.filter2D(gray, cv2.CV_64F, kernel_x)
-        grad_y = cv2.filter2D(gray, cv2.CV_64F, kernel_y)
-        
-        grad = np.sqrt(grad_x**2 + grad_y**2)
-        grad = np.uint8(grad / grad.max() * 255)
-        
-        edges_rgb = cv2.cvtColor(grad, cv2.COLOR_GRAY2BGR)
+        edges_rgb = apply_roberts(self.original_image)
         self.processed_image = edges_rgb
         self.display_image(edges_rgb, self.processed_label)
     
     def reset_image(self):
         if self.original_image is not None:
             self.processed_image = None
-            self.processed_label.clear()
-            self.processed_label.setText("Результат обработки")
+            clear_label_image(self.processed_label, "Результат обработки")
     
     def display_image(self, image, label):
-        if len(image.shape) == 2:  # Ч/Б изображение
-            qimage = QImage(image.data, image.shape[1], image.shape[0], 
-                           image.shape[1], QImage.Format_Grayscale8)
-        else:  # Цветное изображение
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            h, w, ch = rgb_image.shape
-            bytes_per_line = ch * w
-            qimage = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        
-        pixmap = QPixmap.fromImage(qimage)
-        label.setPixmap(pixmap.scaled(label.width(), label.height(), 
-                                     Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        
-        # Обновляем текст метки
-        if label == self.original_label:
-            label.setText("")
-        elif label == self.processed_label:
-            label.setText("")
+        set_label_image(label, image)
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = ImageProcessingApp()
     window.show()
+    exit_after_startup(app.quit)
     sys.exit(app.exec_())
\ No newline at end of file
@@ -1,12 +1,32 @@
+import os
 import sys
-import cv2
-import numpy as np
+import argparse
+import queue
+from lazy_imports import lazy_import
+from profiling import profiled, install_overlay
+from startup_time import exit_after_startup
+from descriptor_cache import descriptor_cache
+from image_core import open_image, read_image, set_label_image
+from video_processing import (PIPELINE_END, VideoPipeline, fit_to_size, blur_moving_objects,
+                              RoiMotionBlur, AdaptiveBackgroundSubtraction, process_video_headless,
+                              print_video_report, process_videos_batch)
+from features import (create_detector, detect_keypoints_tiled, KeypointTracker, draw_tracks,
+                      track_video_headless, list_image_files, ratio_test_matches,
+                      extract_features_parallel, find_similar_pairs)
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel, QPushButton,
-                             QFileDialog, QHBoxLayout, QListWidget, QMessageBox)
-from PyQt5.QtGui import QPixmap, QImage
+                             QFileDialog, QHBoxLayout, QListWidget, QMessageBox, QCheckBox,
+                             QComboBox)
 from PyQt5.QtCore import QTimer
 
+# OpenCV и numpy загружаются при первом использовании, чтобы окно появлялось быстрее
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+
+
 class ImageVideoProcessor(QWidget):
+    # Максимальный размер кадра при показе видео в окне
+    VIDEO_DISPLAY_SIZE = (1280, 720)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Image and Video Processing App")
@@ -27,10 +47,17 @@ class ImageVideoProcessor(QWidget):
             detector_layout.addWidget(btn)
         self.layout.addLayout(detector_layout)
 
+        self.chk_tiled = QCheckBox("Поиск точек по сетке тайлов (многопоточно, равномерно)")
+        self.layout.addWidget(self.chk_tiled)
+
         self.btn_load_multiple_images = QPushButton("Загрузить от 3 до 10 изображений")
         self.btn_load_multiple_images.clicked.connect(self.load_multiple_images)
         self.layout.addWidget(self.btn_load_multiple_images)
 
+        self.btn_find_similar = QPushButton("Найти похожие изображения в папке (индекс)")
+        self.btn_find_similar.clicked.connect(self.find_similar_in_folder)
+        self.layout.addWidget(self.btn_find_similar)
+
         self.btn_load_video_bg = QPushButton("Загрузить видео для вычитания фона")
         self.btn_load_video_bg.clicked.connect(self.load_video_bg_subtraction)
         self.layout.addWidget(self.btn_load_video_bg)
@@ -39,17 +66,57 @@ class ImageVideoProcessor(QWidget):
         self.btn_load_video_blur.clicked.connect(self.load_video_blur_motion)
         self.layout.addWidget(self.btn_load_video_blur)
 
+        self.chk_roi_blur = QCheckBox("Размывать только области движения (быстрый режим)")
+        self.layout.addWidget(self.chk_roi_blur)
+
+        self.btn_video_adaptive = QPushButton("Вычитание фона в реальном времени (адаптивное разрешение)")
+        self.btn_video_adaptive.clicked.connect(self.load_video_adaptive)
+        self.layout.addWidget(self.btn_video_adaptive)
+
+        tracking_layout = QHBoxLayout()
+        self.track_detector = QComboBox()
+        self.track_detector.addItems(["Harris", "SIFT", "SURF", "FAST"])
+        self.track_detector.setCurrentText("FAST")
+        tracking_layout.addWidget(self.track_detector)
+        self.btn_video_tracking = QPushButton("Отслеживание ключевых точек на видео")
+        self.btn_video_tracking.clicked.connect(self.load_video_tracking)
+        tracking_layout.addWidget(self.btn_video_tracking)
+        self.layout.addLayout(tracking_layout)
+
+        self.btn_stop_video = QPushButton("Остановить видео")
+        self.btn_stop_video.clicked.connect(self.stop_video)
+        self.btn_stop_video.setEnabled(False)
+        self.layout.addWidget(self.btn_stop_video)
+
         self.setLayout(self.layout)
 
         self.image = None
+        self.image_path = None
         self.images = []
 
+        self.pipeline = None
+        self.tracker = None
+        self.pending_frame = None
+        self.video_timer = QTimer(self)
+        self.video_timer.timeout.connect(self.show_next_frame)
+
+        install_overlay(self)
+
     def load_image(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Выбрать изображение")
-        if path:
-            self.image = cv2.imread(path)
+        path, image = open_image(self, "Выбрать изображение", "")
+        if image is not None:
+            self.image = image
+            self.image_path = path
             self.display_image(self.image)
 
+    def cached_detect(self, detector_type, detect, **params):
+        # Ключевые точки загруженного файла берутся из дискового кэша, если есть
+        kp, _ = descriptor_cache.get_or_compute(
+            self.image_path, dict(params, detector=detector_type, descriptors=False),
+            lambda: (detect(), None))
+        return kp
+
+    @profiled("lab_5.detect_keypoints")
     def detect_keypoints(self, detector_type):
         if self.image is None:
             QMessageBox.warning(self, "Ошибка", "Сначала загрузите изображение")
@@ -58,24 +125,36 @@ class ImageVideoProcessor(QWidget):
         gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
         img_out = self.image.copy()
 
+        if self.chk_tiled.isChecked():
+            try:
+                kp = self.cached_detect(detector_type,
+                                        lambda: detect_keypoints_tiled(gray, detector_type),
+                                        tiled=True)
+            except AttributeError:
+                QMessageBox.warning(self, "Ошибка", "SURF не поддерживается в вашей версии OpenCV. Убедитесь, что установлена opencv-contrib.")
+                return
+            color = (0, 0, 255) if detector_type == "Harris" else (-1, -1, -1)
+            self.display_image(cv2.drawKeypoints(img_out, kp, None, color=color))
+            return
+
         if detector_type == "Harris":
             dst = cv2.cornerHarris(np.float32(gray), 2, 3, 0.04)
             img_out[dst > 0.01 * dst.max()] = [0, 0, 255]
         elif detector_type == "SIFT":
             sift = cv2.SIFT_create()
-            kp = sift.detect(gray, None)
+            kp = self.cached_detect(detector_type, lambda: sift.detect(gray, None))
             img_out = cv2.drawKeypoints(img_out, kp, None)
         elif detector_type == "SURF":
             try:
                 surf = cv2.xfeatures2d.SURF_create()
-                kp = surf.detect(gray, None)
+                kp = self.cached_detect(detector_type, lambda: surf.detect(gray, None))
                 img_out = cv2.drawKeypoints(img_out, kp, None)
             except AttributeError:
                 QMessageBox.warning(self, "Ошибка", "SURF не поддерживается в вашей версии OpenCV. Убедитесь, что установлена opencv-contrib.")
                 return
         elif detector_type == "FAST":
             fast = cv2.FastFeatureDetector_create()
-            kp = fast.detect(gray, None)
+            kp = self.cached_detect(detector_type, lambda: fast.detect(gray, None))
             img_out = cv2.drawKeypoints(img_out, kp, None)
 
         self.display_image(img_out)
@@ -86,15 +165,9 @@ class ImageVideoProcessor(QWidget):
             QMessageBox.warning(self, "Ошибка", "Выберите от 3 до 10 изображений.")
             return
 
-        self.images = [cv2.imread(f) for f in file_names]
-
-        # Преобразуем изображения в серые и вычисляем дескрипторы SIFT
-        sift = cv2.SIFT_create()
-        descriptors = []
-        for img in self.images:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            kp, des = sift.detectAndCompute(gray, None)
-            descriptors.append(des)
+        # Дескрипторы SIFT вычисляются параллельно в пуле процессов
+        # (с использованием дискового кэша)
+        descriptors = [des for _, des in extract_features_parallel(file_names)]
 
         # Вычисляем схожесть между всеми парами
         bf = cv2.BFMatcher()
@@ -104,21 +177,45 @@ class ImageVideoProcessor(QWidget):
             for j in range(i + 1, len(descriptors)):
                 if descriptors[i] is None or descriptors[j] is None:
                     continue
-                matches = bf.knnMatch(descriptors[i], descriptors[j], k=2)
-                # Применим правило Лоу для отсеивания плохих матчей
-                good = [m for m, n in matches if m.distance < 0.75 * n.distance]
+                good = ratio_test_matches(descriptors[i], descriptors[j], bf)
                 if len(good) > best_score:
                     best_score = len(good)
                     idx_pair = (i, j)
 
+        # Полностью декодируются только изображения найденной пары
+        self.images = [read_image(file_names[i]) for i in idx_pair]
+        self.show_image_pair(*self.images)
+
+    def find_similar_in_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Выберите папку с изображениями")
+        if not folder:
+            return
+        paths = list_image_files(folder)
+        if len(paths) < 2:
+            QMessageBox.warning(self, "Ошибка", "В папке должно быть хотя бы 2 изображения.")
+            return
+
+        pairs = find_similar_pairs(paths)
+        if not pairs:
+            QMessageBox.information(self, "Результат", "Похожих пар не найдено.")
+            return
+
+        i, j, _, _ = pairs[0]
+        self.show_image_pair(read_image(paths[i]), read_image(paths[j]))
+        lines = [f"{os.path.basename(paths[i])} - {os.path.basename(paths[j])}: "
+                 f"сходство {score:.3f}, совпадений {good}"
+                 for i, j, score, good in pairs[:10]]
+        QMessageBox.information(self, "Самые похожие пары", "\n".join(lines))
+
+    def show_image_pair(self, img1, img2):
         # Приведение изображений к одинаковой высоте и цветности
         def ensure_color(img):
             if len(img.shape) == 2:
                 return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
             return img
 
-        img1 = ensure_color(self.images[idx_pair[0]])
-        img2 = ensure_color(self.images[idx_pair[1]])
+        img1 = ensure_color(img1)
+        img2 = ensure_color(img2)
 
         h = min(img1.shape[0], img2.shape[0])
         img1_resized = cv2.resize(img1, (img1.shape[1], h))
@@ -127,57 +224,221 @@ class ImageVideoProcessor(QWidget):
         combined = np.hstack((img1_resized, img2_resized))
 
         # Показываем результат
-        combined_rgb = cv2.cvtColor(combined, cv2.COLOR_BGR2RGB)
-        h, w, ch = combined_rgb.shape
-        bytes_per_line = ch * w
-        q_img = QImage(combined_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_img)
-        self.image_label.setPixmap(pixmap)
+        self.display_image(combined)
         self.image_label.adjustSize()
 
     def load_video_bg_subtraction(self):
         path, _ = QFileDialog.getOpenFileName(self, "Выбрать видео")
         if path:
-            cap = cv2.VideoCapture(path)
             fgbg = cv2.createBackgroundSubtractorMOG2()
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
+
+            def process(frame):
                 fgmask = fgbg.apply(frame)
-                cv2.imshow('Background Subtraction', fgmask)
-                if cv2.waitKey(30) & 0xFF == 27:
-                    break
-            cap.release()
-            cv2.destroyAllWindows()
+                # Маска показывается как есть: display_image поддерживает полутоновые кадры
+                return fit_to_size(fgmask, *self.VIDEO_DISPLAY_SIZE)
+
+            self.start_video(path, process, "lab_5.video_bg_subtraction")
 
     def load_video_blur_motion(self):
         path, _ = QFileDialog.getOpenFileName(self, "Выбрать видео")
         if path:
-            cap = cv2.VideoCapture(path)
-            fgbg = cv2.createBackgroundSubtractorMOG2()
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                fgmask = fgbg.apply(frame)
-                blurred = cv2.GaussianBlur(frame, (51, 51), 0)
-                motion_blur = np.where(fgmask[..., None] > 0, blurred, frame)
-                cv2.imshow('Motion Blur', motion_blur.astype(np.uint8))
-                if cv2.waitKey(30) & 0xFF == 27:
+            if self.chk_roi_blur.isChecked():
+                roi_blur = RoiMotionBlur(fast_blur=True)
+
+                def process(frame):
+                    roi_blur.apply(frame)
+                    return fit_to_size(frame, *self.VIDEO_DISPLAY_SIZE)
+            else:
+                fgbg = cv2.createBackgroundSubtractorMOG2()
+
+                def process(frame):
+                    fgmask = fgbg.apply(frame)
+                    motion_blur = blur_moving_objects(frame, fgmask)
+                    return fit_to_size(motion_blur.astype(np.uint8), *self.VIDEO_DISPLAY_SIZE)
+
+            self.start_video(path, process, "lab_5.video_blur_motion")
+
+    def load_video_adaptive(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Выбрать видео")
+        if not path:
+            return
+        cap = cv2.VideoCapture(path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        subtractor = AdaptiveBackgroundSubtraction(fps if fps and fps > 1 else 30.0)
+        max_w, max_h = self.VIDEO_DISPLAY_SIZE
+
+        def process(frame, index):
+            result = subtractor.process(frame, index)
+            if result is None:
+                return None
+            fgmask, scale, elapsed = result
+            h, w = frame.shape[:2]
+            ratio = min(max_w / w, max_h / h, 1.0)
+            shown = cv2.resize(fgmask, (int(w * ratio), int(h * ratio)),
+                               interpolation=cv2.INTER_NEAREST)
+            shown = cv2.cvtColor(shown, cv2.COLOR_GRAY2BGR)
+            text = (f"scale {scale:.2f}, 1/{subtractor.controller.skip} frames, "
+                    f"{elapsed * 1000:.1f} ms")
+            cv2.putText(shown, text, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            return shown
+
+        self.start_video(path, process, "lab_5.video_adaptive", pass_index=True)
+
+    def load_video_tracking(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Выбрать видео")
+        if not path:
+            return
+        tracker = KeypointTracker(self.track_detector.currentText())
+        if tracker.detector_type == "SURF":
+            try:
+                create_detector("SURF")
+            except AttributeError:
+                QMessageBox.warning(self, "Ошибка", "SURF не поддерживается в вашей версии OpenCV. Убедитесь, что установлена opencv-contrib.")
+                return
+
+        def process(frame):
+            points, detected, latency = tracker.process(frame)
+            return fit_to_size(draw_tracks(frame, points, detected, latency),
+                               *self.VIDEO_DISPLAY_SIZE)
+
+        self.start_video(path, process, "lab_5.video_tracking")
+        if self.pipeline is not None:
+            self.tracker = tracker
+
+    def start_video(self, path, process_frame, name="lab_5.video", pass_index=False):
+        self.stop_video()
+        pipeline = VideoPipeline(path, process_frame, name=name, realtime=True, pass_index=pass_index)
+        if not pipeline.is_opened():
+            QMessageBox.warning(self, "Ошибка", "Не удалось открыть видео")
+            return
+        self.pipeline = pipeline
+        self.pending_frame = None
+        pipeline.start()
+        # Таймер опрашивает очередь результатов с частотой исходного видео
+        self.video_timer.start(max(1, int(1000 / pipeline.fps)))
+        self.btn_stop_video.setEnabled(True)
+
+    def stop_video(self):
+        self.video_timer.stop()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+        if self.tracker is not None:
+            print(self.tracker.summary())
+            self.tracker = None
+        self.pending_frame = None
+        self.btn_stop_video.setEnabled(False)
+
+    def show_next_frame(self):
+        if self.pipeline is None:
+            return
+        # Номер кадра, который должен быть на экране в данный момент
+        target = self.pipeline.target_index()
+        frame = None
+        while True:
+            if self.pending_frame is None:
+                try:
+                    self.pending_frame = self.pipeline.results.get_nowait()
+                except queue.Empty:
                     break
-            cap.release()
-            cv2.destroyAllWindows()
+            if self.pending_frame is PIPELINE_END:
+                if frame is not None:
+                    self.display_image(frame)
+                error = self.pipeline.error
+                self.stop_video()
+                if error is not None:
+                    print(f"Ошибка обработки видео: {error!r}")
+                    QMessageBox.warning(self, "Ошибка", f"Ошибка обработки видео: {error}")
+                return
+            index, result = self.pending_frame
+            if index > target:
+                # Кадр ещё рано показывать - ждём следующего тика
+                break
+            # Отстающие кадры пропускаются, показывается только самый свежий
+            frame = result
+            self.pending_frame = None
+        if frame is not None:
+            self.display_image(frame)
+
+    def closeEvent(self, event):
+        self.stop_video()
+        super().closeEvent(event)
 
     def display_image(self, img):
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb.shape
-        bytes_per_line = ch * w
-        qimg = QImage(rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        self.image_label.setPixmap(QPixmap.fromImage(qimg))
+        # Кадры уже приведены к размеру окна, поэтому показываются без масштабирования;
+        # цветные (BGR) и полутоновые изображения отображаются без копирования
+        set_label_image(self.image_label, img, scaled=False)
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Обработка изображений и видео")
+    parser.add_argument("--headless", metavar="VIDEO",
+                        help="обработать видео без окна и записать результат в файлы")
+    parser.add_argument("--mask-out", help="файл для маски переднего плана")
+    parser.add_argument("--blur-out", help="файл для видео с размытыми движущимися объектами")
+    parser.add_argument("--roi-blur", action="store_true",
+                        help="размывать только области движения, маска на уменьшенном кадре")
+    parser.add_argument("--mask-scale", type=float, default=0.5,
+                        help="масштаб кадра для MOG2 в режиме --roi-blur")
+    parser.add_argument("--fast-blur", action="store_true",
+                        help="приближённое размытие через уменьшение кадра (режим --roi-blur)")
+    parser.add_argument("--batch", nargs="+", metavar="VIDEO",
+                        help="обработать несколько видео параллельно пулом процессов")
+    parser.add_argument("--out-dir", default="output", help="каталог для результатов --batch")
+    parser.add_argument("--workers", type=int, help="число процессов для --batch и --similar")
+    parser.add_argument("--segment-frames", type=int,
+                        help="делить длинные видео на сегменты указанной длины (кадров)")
+    parser.add_argument("--warmup", type=int, default=100,
+                        help="число кадров прогрева MOG2 перед началом сегмента")
+    parser.add_argument("--similar", metavar="FOLDER",
+                        help="найти самые похожие пары изображений в папке")
+    parser.add_argument("--top", type=int, default=20,
+                        help="сколько пар-кандидатов проверять правилом Лоу (--similar)")
+    parser.add_argument("--reduce", type=int, choices=(1, 2, 4, 8), default=1,
+                        help="уменьшенное декодирование изображений в N раз (--similar)")
+    parser.add_argument("--max-side", type=int,
+                        help="уменьшать изображения до этой длины большей стороны (--similar)")
+    parser.add_argument("--max-keypoints", type=int, default=500,
+                        help="максимум ключевых точек на изображение (--similar)")
+    parser.add_argument("--track", metavar="VIDEO",
+                        help="отслеживание ключевых точек на видео с отчётом по кадрам")
+    parser.add_argument("--detector", choices=("Harris", "SIFT", "SURF", "FAST"), default="FAST",
+                        help="детектор для --track")
+    parser.add_argument("--redetect", type=int, default=30,
+                        help="запускать детектор каждые N кадров (--track)")
+    args, qt_args = parser.parse_known_args()
+
+    if args.track:
+        track_video_headless(args.track, args.detector, args.redetect)
+        sys.exit(0)
+
+    if args.similar:
+        paths = list_image_files(args.similar)
+        extract_options = {"workers": args.workers, "reduce": args.reduce,
+                           "max_side": args.max_side, "nfeatures": args.max_keypoints}
+        for i, j, score, good in find_similar_pairs(paths, verify_top=args.top,
+                                                    extract_options=extract_options):
+            print(f"{good:6d} {score:.3f}  {paths[i]}  {paths[j]}")
+        sys.exit(0)
+
+    if args.batch:
+        process_videos_batch(args.batch, args.out_dir, workers=args.workers,
+                             segment_frames=args.segment_frames, warmup=args.warmup,
+                             roi_blur=args.roi_blur, mask_scale=args.mask_scale,
+                             fast_blur=args.fast_blur)
+        sys.exit(0)
+
+    if args.headless:
+        if not (args.mask_out or args.blur_out):
+            parser.error("укажите --mask-out и/или --blur-out")
+        roi_blur = RoiMotionBlur(args.mask_scale, fast_blur=args.fast_blur) if args.roi_blur else None
+        print_video_report(args.headless,
+                           process_video_headless(args.headless, args.mask_out, args.blur_out,
+                                                  roi_blur=roi_blur))
+        sys.exit(0)
+
+    app = QApplication(sys.argv[:1] + qt_args)
     window = ImageVideoProcessor()
     window.show()
+    exit_after_startup(app.quit)
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,38 @@
+import sys
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    # Заместитель модуля: настоящий импорт выполняется при первом обращении
+    # к любому атрибуту, после чего атрибуты модуля копируются в заместитель
+    # и дальнейшие обращения стоят как обычные. Если модуль уже импортирован
+    # кем-то ещё, возвращается сам модуль (см. lazy_import)
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_target"] = name
+
+    def _load(self):
+        module = importlib.import_module(self.__dict__["_lazy_target"])
+        self.__dict__.update(module.__dict__)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        loaded = "загружен" if "__file__" in self.__dict__ else "не загружен"
+        return f"<lazy module '{self.__dict__['_lazy_target']}' ({loaded})>"
+
+
+def lazy_import(name):
+    # Использование: cv2 = lazy_import("cv2") вместо import cv2.
+    # Подходит только для модулей, к атрибутам которых нет обращений на уровне
+    # модуля (в аргументах по умолчанию, константах классов и т.п.)
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
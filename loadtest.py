@@ -0,0 +1,175 @@
+import sys
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit, urlencode
+
+
+# Нагрузочный клиент для service.py: несколько постоянных соединений
+# отправляют одно и то же изображение, пока не будет выполнено заданное
+# число запросов или не истечёт время. 503 (очередь заполнена) считается
+# отдельно: клиент ждёт Retry-After и повторяет запрос, не расходуя бюджет
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Сервер закрыл соединение")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers, body
+
+
+async def request(host, port, method, path, body=b""):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+        return await read_response(reader)
+    finally:
+        writer.close()
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+
+async def client(host, port, path, payload, stats, deadline, budget):
+    # budget - общий счётчик оставшихся запросов (список из одного числа)
+    head = (f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/octet-stream\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n").encode()
+    reader = writer = None
+    while budget[0] > 0 and time.monotonic() < deadline:
+        budget[0] -= 1
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.perf_counter()
+            writer.write(head)
+            writer.write(payload)
+            await writer.drain()
+            status, headers, body = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            stats.errors += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        stats.bytes_out += len(payload)
+        stats.bytes_in += len(body)
+        if status == 200:
+            stats.latencies.append(time.perf_counter() - start)
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+            reader = writer = None
+        if status == 503:
+            # Отклонённый запрос не расходует бюджет: после паузы он повторяется
+            await asyncio.sleep(float(headers.get("retry-after", "1")))
+            budget[0] += 1
+    if writer is not None:
+        writer.close()
+
+
+async def fetch_counters(host, port):
+    # Метрики сервиса без меток (счётчики и показатели) из /metrics
+    try:
+        status, _, body = await request(host, port, "GET", "/metrics")
+    except OSError:
+        return {}
+    metrics = {}
+    if status == 200:
+        for line in body.decode().splitlines():
+            if line and not line.startswith("#") and "{" not in line:
+                name, value = line.rsplit(" ", 1)
+                metrics[name] = float(value)
+    return metrics
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def run(args, payload):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    params = dict(p.split("=", 1) for p in args.param)
+    if args.format:
+        params["format"] = args.format
+    path = f"/ops/{args.op}" + (f"?{urlencode(params)}" if params else "")
+
+    before = await fetch_counters(host, port)
+    stats = LoadStats()
+    deadline = time.monotonic() + (args.duration or float("inf"))
+    budget = [args.requests if not args.duration else float("inf")]
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, path, payload, stats, deadline, budget)
+                           for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ok = stats.statuses.get(200, 0)
+    ordered = sorted(stats.latencies)
+    print(f"Операция {args.op}: {sum(stats.statuses.values())} ответов за {elapsed:.2f} с, "
+          f"соединений {args.concurrency}")
+    print(f"  коды ответов: {dict(sorted(stats.statuses.items()))}, ошибок соединения: {stats.errors}")
+    print(f"  пропускная способность: {ok / elapsed:.1f} успешных запросов/с, "
+          f"отправлено {stats.bytes_out / elapsed / 1e6:.1f} МБ/с, получено {stats.bytes_in / elapsed / 1e6:.1f} МБ/с")
+    if ordered:
+        print(f"  задержка, мс: p50 {percentile(ordered, 0.5) * 1000:.1f}, p90 {percentile(ordered, 0.9) * 1000:.1f}, "
+              f"p99 {percentile(ordered, 0.99) * 1000:.1f}, максимум {ordered[-1] * 1000:.1f}")
+
+    # Метрики сервиса за время теста: насколько запросы объединялись в пакеты
+    after = await fetch_counters(host, port)
+    batches = after.get("service_batches_total", 0) - before.get("service_batches_total", 0)
+    if batches:
+        batched = (after.get("service_batched_requests_total", 0)
+                   - before.get("service_batched_requests_total", 0))
+        rejected = after.get("service_rejected_total", 0) - before.get("service_rejected_total", 0)
+        print(f"  сервис: пакетов {batches:.0f}, средний размер пакета {batched / batches:.2f}, "
+              f"отклонено {rejected:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервиса операций лабораторных")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--op", default="lab4.canny", help="имя операции (GET /ops - список)")
+    parser.add_argument("--param", action="append", default=[], metavar="ИМЯ=ЗНАЧЕНИЕ",
+                        help="параметр операции, можно повторять")
+    parser.add_argument("--format", help="формат результата: png, jpg или npy")
+    parser.add_argument("--image", help="файл изображения (по умолчанию - синтетическое)")
+    parser.add_argument("--size", default="640x480", help="размер синтетического изображения")
+    parser.add_argument("--concurrency", type=int, default=16, help="число одновременных соединений")
+    parser.add_argument("--requests", type=int, default=500, help="общее число запросов")
+    parser.add_argument("--duration", type=float, help="вместо числа запросов - длительность в секундах")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            payload = f.read()
+    else:
+        import cv2
+        from benchmark import synthetic_image
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        payload = cv2.imencode(".jpg", synthetic_image(width, height))[1].tobytes()
+    try:
+        asyncio.run(run(args, payload))
+    except OSError as e:
+        print(f"Нет соединения с сервисом {args.url}: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
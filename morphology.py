@@ -0,0 +1,19 @@
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+
+
+# Морфология лабораторной 3 без интерфейса (см. lab_3)
+
+def morphology(image, operation, kernel_size=5):
+    # Морфологическая операция с квадратным ядром; None для неизвестной операции
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    
+    if operation == cv2.MORPH_ERODE:
+        return cv2.erode(image, kernel, iterations=1)
+    elif operation == cv2.MORPH_DILATE:
+        return cv2.dilate(image, kernel, iterations=1)
+    elif operation in (cv2.MORPH_OPEN, cv2.MORPH_CLOSE, cv2.MORPH_GRADIENT):
+        return cv2.morphologyEx(image, operation, kernel)
+    return None
@@ -0,0 +1,244 @@
+import io
+import json
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+color_models = lazy_import("color_models")
+image_adjust = lazy_import("image_adjust")
+morphology = lazy_import("morphology")
+filters = lazy_import("filters")
+features = lazy_import("features")
+
+
+# Операции лабораторных над одним изображением для сервиса и пакетной
+# обработки. Каждая операция получает изображение BGR (как после cv2.imread)
+# и параметры, а возвращает изображение (uint8 BGR или полутоновое),
+# массив float32 (цветовые модели) или словарь для JSON
+
+MORPH_OPERATIONS = {
+    "erode": "MORPH_ERODE",
+    "dilate": "MORPH_DILATE",
+    "open": "MORPH_OPEN",
+    "close": "MORPH_CLOSE",
+    "gradient": "MORPH_GRADIENT",
+}
+
+
+# В цепочке (cli.py) на вход может прийти полутоновый результат предыдущего шага
+def _rgb(image):
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB if image.ndim == 2 else cv2.COLOR_BGR2RGB)
+
+
+def _bgr(image):
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image
+
+
+def _gray(image):
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def lab1_convert(image, model="HSV"):
+    return color_models.convert_image(_rgb(image), model)
+
+
+def lab1_pixel(image, x=0, y=0):
+    h, w = image.shape[:2]
+    if not (0 <= x < w and 0 <= y < h):
+        raise ValueError(f"Точка ({x}, {y}) вне изображения {w}x{h}")
+    b, g, r = (int(v) for v in _bgr(image)[y, x])
+    return color_models.pixel_color_models(r, g, b)
+
+
+def lab1_stats(image, bins=32, colors=5, max_pixels=1 << 18):
+    if bins < 1 or colors < 0 or max_pixels < 1:
+        raise ValueError("bins и max_pixels должны быть положительными, colors - неотрицательным")
+    return color_models.image_color_stats(color_models.subsample(_rgb(image), max_pixels), bins, colors)
+
+
+def lab2_adjust(image, brightness=0, contrast=0, saturation=0):
+    # image_adjust (lab_2) работает в RGB
+    result = image_adjust.adjust_image_array(_rgb(image), brightness, contrast, saturation)
+    return cv2.cvtColor(result, cv2.COLOR_RGB2BGR)
+
+
+def lab2_gray(image):
+    return _gray(image)
+
+
+def lab2_linear(image):
+    result = image_adjust.linear_correction(_gray(image))
+    if result is None:
+        raise ValueError("Все пиксели изображения одинаковые")
+    return result
+
+
+def lab2_gamma(image, gamma=1.5):
+    if gamma <= 0:
+        raise ValueError("gamma должна быть положительной")
+    return image_adjust.gamma_correction(_gray(image), gamma)
+
+
+def lab2_histogram(image, channel="RGB"):
+    series, label = image_adjust.compute_histograms(_rgb(image), channel)
+    return {"channel": label,
+            "histograms": {color: hist.ravel().astype(int).tolist() for hist, color in series}}
+
+
+def lab3_morphology(image, op="erode", kernel=5):
+    if op not in MORPH_OPERATIONS:
+        raise ValueError(f"Неизвестная операция: {op} (допустимы {', '.join(MORPH_OPERATIONS)})")
+    if kernel < 1:
+        raise ValueError("kernel должен быть положительным")
+    return morphology.morphology(image, getattr(cv2, MORPH_OPERATIONS[op]), kernel)
+
+
+def _odd_size(size):
+    if size < 1 or size % 2 == 0:
+        raise ValueError("size должен быть положительным нечётным числом")
+    return size
+
+
+def lab4_sharpen(image):
+    return filters.apply_sharpen(image)
+
+
+def lab4_motion_blur(image, size=15):
+    if size < 1:
+        raise ValueError("size должен быть положительным")
+    return filters.apply_motion_blur(image, size)
+
+
+def lab4_emboss(image):
+    return filters.apply_emboss(image)
+
+
+def lab4_median(image, size=5):
+    return filters.apply_median(image, _odd_size(size))
+
+
+def lab4_canny(image):
+    return filters.apply_canny(_bgr(image))
+
+
+def lab4_roberts(image):
+    return filters.apply_roberts(_bgr(image))
+
+
+# Детекторы создаются один раз на процесс
+_detectors = {}
+
+
+def lab5_keypoints(image, detector="SIFT", max_points=0, tiled=0, draw=0):
+    gray = _gray(image)
+    try:
+        if tiled:
+            keypoints = features.detect_keypoints_tiled(gray, detector)
+        elif detector == "Harris":
+            keypoints = features.harris_keypoints(gray, max_points or None)
+        else:
+            if detector not in _detectors:
+                _detectors[detector] = features.create_detector(detector)
+            keypoints = _detectors[detector].detect(gray, None)
+    except AttributeError:
+        # cv2.xfeatures2d есть только в opencv-contrib
+        raise ValueError(f"{detector} требует opencv-contrib")
+    if max_points and len(keypoints) > max_points:
+        keypoints = sorted(keypoints, key=lambda kp: kp.response, reverse=True)[:max_points]
+    if draw:
+        color = (0, 0, 255) if detector == "Harris" else (-1, -1, -1)
+        return cv2.drawKeypoints(image, keypoints, None, color=color)
+    return {"detector": detector, "count": len(keypoints),
+            "keypoints": [[round(kp.pt[0], 2), round(kp.pt[1], 2), round(kp.size, 2),
+                           round(kp.angle, 2), float(kp.response)] for kp in keypoints]}
+
+
+def _keypoints_kind(params):
+    return "image" if params["draw"] else "json"
+
+
+# имя -> (функция, параметры по умолчанию, вид результата). Тип параметра
+# берётся из значения по умолчанию; вид результата - "image" (uint8),
+# "array" (float32, .npy) или "json", либо функция параметров, если зависит от них
+OPERATIONS = {
+    "lab1.convert": (lab1_convert, {"model": "HSV"}, "array"),
+    "lab1.pixel": (lab1_pixel, {"x": 0, "y": 0}, "json"),
+    "lab1.stats": (lab1_stats, {"bins": 32, "colors": 5, "max_pixels": 1 << 18}, "json"),
+    "lab2.adjust": (lab2_adjust, {"brightness": 0, "contrast": 0, "saturation": 0}, "image"),
+    "lab2.gray": (lab2_gray, {}, "image"),
+    "lab2.linear": (lab2_linear, {}, "image"),
+    "lab2.gamma": (lab2_gamma, {"gamma": 1.5}, "image"),
+    "lab2.histogram": (lab2_histogram, {"channel": "RGB"}, "json"),
+    "lab3.morphology": (lab3_morphology, {"op": "erode", "kernel": 5}, "image"),
+    "lab4.sharpen": (lab4_sharpen, {}, "image"),
+    "lab4.motion_blur": (lab4_motion_blur, {"size": 15}, "image"),
+    "lab4.emboss": (lab4_emboss, {}, "image"),
+    "lab4.median": (lab4_median, {"size": 5}, "image"),
+    "lab4.canny": (lab4_canny, {}, "image"),
+    "lab4.roberts": (lab4_roberts, {}, "image"),
+    "lab5.keypoints": (lab5_keypoints, {"detector": "SIFT", "max_points": 0, "tiled": 0, "draw": 0},
+                       _keypoints_kind),
+}
+
+# Расширения файлов, которые считаются изображениями при обходе каталогов
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def init_worker():
+    # Для процессов пула: один поток OpenCV на процесс (параллелизм даёт сам
+    # пул), модули лабораторных загружаются сразу, а не при первой задаче
+    import importlib
+    cv2.setNumThreads(1)
+    for name in ("color_models", "image_adjust", "morphology", "filters", "features"):
+        importlib.import_module(name)
+
+
+def parse_params(name, raw):
+    # Приведение строковых параметров (из URL или командной строки) к типам
+    # значений по умолчанию. Неизвестная операция - KeyError, неверный параметр - ValueError
+    _, defaults, _ = OPERATIONS[name]
+    params = dict(defaults)
+    for key, value in raw.items():
+        if key not in defaults:
+            raise ValueError(f"Неизвестный параметр {key} у {name} (допустимы: {', '.join(defaults) or 'нет'})")
+        kind = type(defaults[key])
+        try:
+            params[key] = kind(value)
+        except ValueError:
+            raise ValueError(f"Параметр {key} должен быть {kind.__name__}: {value!r}")
+    return params
+
+
+def apply_operation(name, image, params):
+    fn, _, _ = OPERATIONS[name]
+    return fn(image, **params)
+
+
+def result_kind(name, params):
+    kind = OPERATIONS[name][2]
+    return kind(params) if callable(kind) else kind
+
+
+def encode_result(result, image_format="png"):
+    # Результат -> (тип содержимого, байты). Изображения uint8 кодируются в
+    # PNG/JPEG либо отдаются как .npy; прочие массивы - всегда .npy
+    if isinstance(result, dict):
+        return "application/json", json.dumps(result, ensure_ascii=False).encode()
+    if image_format == "npy" or result.dtype != np.uint8:
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(result))
+        return "application/x-npy", buffer.getvalue()
+    ext = {"png": ".png", "jpg": ".jpg", "jpeg": ".jpg"}.get(image_format)
+    if ext is None:
+        raise ValueError(f"Неизвестный формат: {image_format}")
+    ok, data = cv2.imencode(ext, result)
+    if not ok:
+        raise ValueError(f"Не удалось закодировать результат в {image_format}")
+    return ("image/png" if ext == ".png" else "image/jpeg"), data.tobytes()
+
+
+def decode_image(data):
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Не удалось декодировать изображение")
+    return image
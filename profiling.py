@@ -0,0 +1,242 @@
+import os
+import atexit
+import json
+import time
+import threading
+import functools
+import tracemalloc
+from collections import deque
+
+
+# Флаг функции с *args (inspect.CO_VARARGS); inspect не импортируется ради
+# одной константы - модуль загружается при запуске каждой лабораторной
+CO_VARARGS = 0x04
+
+
+class Profiler:
+    # Замеры времени и пиковых выделений памяти для операций лабораторных.
+    # Последние записи хранятся в кольцевом буфере; статистика (last/avg/p95)
+    # считается по нему. Когда профилирование выключено, обёртка profiled
+    # только проверяет флаг enabled и сразу вызывает функцию.
+    def __init__(self, capacity=2000):
+        self.enabled = False
+        self.track_memory = False
+        self.records = deque(maxlen=capacity)
+        self.totals = {}  # операция -> [число вызовов, суммарное время] за всё время
+        self.sinks = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self, track_memory=False):
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.track_memory = False
+
+    def call(self, name, fn, args, kwargs):
+        # Пик памяти измеряется только для внешнего вызова в потоке: сброс пика
+        # во вложенном вызове испортил бы замер внешнего. tracemalloc общий для
+        # процесса, поэтому пик включает выделения параллельных потоков
+        depth = getattr(self.local, "depth", 0)
+        measure_memory = self.track_memory and depth == 0 and tracemalloc.is_tracing()
+        if measure_memory:
+            start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            self.local.depth = depth
+            peak = None
+            if measure_memory and tracemalloc.is_tracing():
+                peak = max(0, tracemalloc.get_traced_memory()[1] - start_memory)
+            self.record(name, duration, peak)
+
+    def record(self, name, duration, peak=None):
+        record = {"operation": name, "time": time.time(), "duration": duration,
+                  "peak_bytes": peak}
+        with self.lock:
+            self.records.append(record)
+            total = self.totals.setdefault(name, [0, 0.0])
+            total[0] += 1
+            total[1] += duration
+            sinks = list(self.sinks)
+        for sink in sinks:
+            sink.write(record, self)
+
+    def add_sink(self, sink):
+        with self.lock:
+            self.sinks.append(sink)
+
+    def stats(self):
+        # операция -> count, last, avg, p95 (секунды), peak_bytes последнего замера
+        with self.lock:
+            records = list(self.records)
+            totals = {name: list(total) for name, total in self.totals.items()}
+        durations = {}
+        last = {}
+        for record in records:
+            durations.setdefault(record["operation"], []).append(record["duration"])
+            last[record["operation"]] = record
+        result = {}
+        for name, values in durations.items():
+            ordered = sorted(values)
+            result[name] = {
+                "count": totals.get(name, [len(values)])[0],
+                "sum": totals.get(name, [0, sum(values)])[1],
+                "last": last[name]["duration"],
+                "avg": sum(values) / len(values),
+                "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+                "peak_bytes": last[name]["peak_bytes"],
+            }
+        return result
+
+
+class JsonlSink:
+    # Каждая запись - отдельная строка JSON
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def write(self, record, profiler):
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+
+
+class PrometheusSink:
+    # Файл в текстовом формате Prometheus (для node_exporter textfile collector);
+    # перезаписывается атомарно не чаще раза в interval секунд
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self.last_write = 0.0
+        self.lock = threading.Lock()
+
+    def write(self, record, profiler):
+        if time.monotonic() - self.last_write >= self.interval:
+            self.flush(profiler)
+
+    def flush(self, profiler):
+        with self.lock:
+            self.last_write = time.monotonic()
+            text = format_prometheus(profiler.stats())
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+
+
+def format_prometheus(stats, prefix="lab_operation"):
+    lines = [f"# HELP {prefix}_duration_seconds Operation duration (recent window quantiles)",
+             f"# TYPE {prefix}_duration_seconds summary"]
+    for name, s in sorted(stats.items()):
+        label = f'operation="{name}"'
+        lines.append(f'{prefix}_duration_seconds{{{label},quantile="0.95"}} {s["p95"]:.6f}')
+        lines.append(f'{prefix}_duration_seconds_sum{{{label}}} {s["sum"]:.6f}')
+        lines.append(f'{prefix}_duration_seconds_count{{{label}}} {s["count"]}')
+    lines.append(f"# HELP {prefix}_peak_bytes Peak traced allocation of the last call")
+    lines.append(f"# TYPE {prefix}_peak_bytes gauge")
+    for name, s in sorted(stats.items()):
+        if s["peak_bytes"] is not None:
+            lines.append(f'{prefix}_peak_bytes{{operation="{name}"}} {s["peak_bytes"]}')
+    return "\n".join(lines) + "\n"
+
+
+# Общий профилировщик для всех лабораторных
+profiler = Profiler()
+
+
+def profiled(name):
+    def decorator(fn):
+        # Сигналы Qt (clicked, valueChanged) передают слоту лишние аргументы,
+        # которые PyQt отбрасывает, глядя на число параметров функции. Обёртка
+        # принимает *args, поэтому отбрасывает их сама так же, как PyQt
+        code = getattr(fn, "__code__", None)
+        max_args = None
+        if code is not None and not code.co_flags & CO_VARARGS:
+            max_args = code.co_argcount
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if max_args is not None:
+                args = args[:max_args]
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            return profiler.call(name, fn, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def configure_from_env():
+    # LAB_PROFILE=1 - включить замеры, LAB_PROFILE_MEMORY=1 - и пики памяти,
+    # LAB_PROFILE_SINK=файл.jsonl или файл.prom - куда выгружать метрики
+    if os.environ.get("LAB_PROFILE", "0") != "0":
+        profiler.enable(track_memory=os.environ.get("LAB_PROFILE_MEMORY", "0") != "0")
+    sink_path = os.environ.get("LAB_PROFILE_SINK")
+    if sink_path:
+        if sink_path.endswith(".jsonl"):
+            profiler.add_sink(JsonlSink(sink_path))
+        else:
+            sink = PrometheusSink(sink_path)
+            profiler.add_sink(sink)
+            # Последние замеры не должны потеряться из-за ограничения частоты записи
+            atexit.register(sink.flush, profiler)
+
+
+def format_overlay(stats):
+    if not stats:
+        return "Нет замеров"
+    lines = [f"{'операция':<28}{'last':>8}{'avg':>8}{'p95':>8}  мс"]
+    for name, s in sorted(stats.items()):
+        lines.append(f"{name[-28:]:<28}{s['last'] * 1000:8.1f}{s['avg'] * 1000:8.1f}"
+                     f"{s['p95'] * 1000:8.1f}")
+    return "\n".join(lines)
+
+
+def install_overlay(window, shortcut="F12"):
+    # Полупрозрачная панель поверх окна Qt со статистикой операций.
+    # Переключается клавишей shortcut; пока панель видна, профилирование включено
+    from PyQt5.QtWidgets import QLabel, QShortcut
+    from PyQt5.QtGui import QKeySequence, QFont
+    from PyQt5.QtCore import QTimer
+
+    overlay = QLabel(window)
+    overlay.setFont(QFont("Monospace", 9))
+    overlay.setStyleSheet("background-color: rgba(0, 0, 0, 170); color: #7CFC00; padding: 6px;")
+    overlay.hide()
+    timer = QTimer(overlay)
+
+    def refresh():
+        overlay.setText(format_overlay(profiler.stats()))
+        overlay.adjustSize()
+        overlay.move(10, 10)
+        overlay.raise_()
+
+    def toggle():
+        if overlay.isVisible():
+            timer.stop()
+            overlay.hide()
+            if os.environ.get("LAB_PROFILE", "0") == "0":
+                profiler.disable()
+        else:
+            if not profiler.enabled:
+                profiler.enable(track_memory=os.environ.get("LAB_PROFILE_MEMORY", "0") != "0")
+            refresh()
+            overlay.show()
+            timer.start(500)
+
+    timer.timeout.connect(refresh)
+    QShortcut(QKeySequence(shortcut), window, toggle)
+    return overlay
+
+
+configure_from_env()
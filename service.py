@@ -0,0 +1,374 @@
+import os
+import sys
+import json
+import signal
+import asyncio
+import argparse
+import functools
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qsl
+from concurrent.futures import ProcessPoolExecutor
+from profiling import Profiler, format_prometheus
+import operations
+
+
+# Локальный HTTP-сервис с операциями лабораторных (operations.OPERATIONS).
+#   POST /ops/<операция>?параметры[&format=png|jpg|npy]  тело - файл изображения
+#   GET  /ops      - список операций и параметров по умолчанию
+#   GET  /metrics  - метрики в текстовом формате Prometheus
+#   GET  /health
+# Вычисления выполняются в пуле процессов; одинаковые запросы (операция и
+# параметры), пришедшие почти одновременно, отправляются в пул одним пакетом
+
+STREAM_CHUNK = 256 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def run_batch(name, params, image_format, payloads):
+    # Выполняется в процессе пула: пакет изображений для одной операции с
+    # одинаковыми параметрами. Ошибка одного изображения не влияет на остальные
+    results = []
+    for data in payloads:
+        try:
+            image = operations.decode_image(data)
+            result = operations.apply_operation(name, image, params)
+            results.append((200, *operations.encode_result(result, image_format)))
+        except ValueError as e:
+            results.append((400, "text/plain; charset=utf-8", str(e).encode()))
+        except Exception as e:
+            results.append((500, "text/plain; charset=utf-8", f"{type(e).__name__}: {e}".encode()))
+    return results
+
+
+class Job:
+    __slots__ = ("name", "data", "arrived", "future")
+
+    def __init__(self, name, data, arrived, future):
+        self.name = name
+        self.data = data
+        self.arrived = arrived
+        self.future = future
+
+
+class MicroBatcher:
+    # Ограниченная очередь заданий, сгруппированных по ключу (операция,
+    # параметры, формат). get() отдаёт до max_batch заданий одной группы.
+    # Пакет выполняется одним процессом последовательно, поэтому при
+    # свободных процессах группа делится между ними поровну и отдаётся сразу;
+    # попутчиков (не дольше max_wait секунд от прихода старейшего задания)
+    # пакет ждёт, только когда все процессы заняты. Переполнение - asyncio.QueueFull
+    def __init__(self, max_depth, max_batch, max_wait):
+        self.max_depth = max_depth
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.groups = OrderedDict()
+        self.depth = 0
+        self.ready = asyncio.Event()
+
+    def full(self):
+        return self.depth >= self.max_depth
+
+    def put(self, key, job):
+        if self.full():
+            raise asyncio.QueueFull
+        self.groups.setdefault(key, []).append(job)
+        self.depth += 1
+        self.ready.set()
+
+    async def get(self, idle_workers=lambda: 0):
+        # idle_workers() - число процессов пула, у которых сейчас нет пакета
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self.groups:
+                self.ready.clear()
+                await self.ready.wait()
+            key, jobs = next(iter(self.groups.items()))
+            idle = idle_workers()
+            if idle > 0:
+                limit = min(self.max_batch, -(-len(jobs) // idle))
+            else:
+                limit = self.max_batch
+                wait = jobs[0].arrived + self.max_wait - loop.time()
+                if len(jobs) < limit and wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+            batch, rest = jobs[:limit], jobs[limit:]
+            del self.groups[key]
+            if rest:
+                # Остаток группы встаёт в конец, чтобы не задерживать другие операции
+                self.groups[key] = rest
+            self.depth -= len(batch)
+            return key, batch
+
+
+class ImageService:
+    def __init__(self, workers=None, queue_size=64, max_batch=8, batch_wait=0.002,
+                 max_body=64 * 1024 * 1024):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_body = max_body
+        self.batcher = MicroBatcher(queue_size, max_batch, batch_wait)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=operations.init_worker)
+        # Пакетов в пуле не больше двух на процесс: следующий пакет уже
+        # передан в пул, пока выполняется текущий, а остальные копятся в очереди
+        self.slots = asyncio.Semaphore(self.workers * 2)
+        self.in_flight = 0
+        self.latency = Profiler()
+        self.queue_wait = Profiler()
+        self.latency.enable()
+        self.queue_wait.enable()
+        self.responses = {}  # (операция, код ответа) -> число
+        self.rejected = 0
+        self.batches = 0
+        self.batched_jobs = 0
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.slots.acquire()
+            key, jobs = await self.batcher.get(lambda: self.workers - self.in_flight)
+            now = loop.time()
+            for job in jobs:
+                self.queue_wait.record(job.name, now - job.arrived)
+            name, params, image_format = key
+            self.in_flight += 1
+            self.batches += 1
+            self.batched_jobs += len(jobs)
+            future = loop.run_in_executor(self.pool, run_batch, name, dict(params), image_format,
+                                          [job.data for job in jobs])
+            future.add_done_callback(functools.partial(self._batch_done, jobs))
+
+    def _batch_done(self, jobs, future):
+        self.slots.release()
+        self.in_flight -= 1
+        try:
+            results = future.result()
+        except Exception as e:
+            # Например, процесс пула аварийно завершился
+            results = [(500, "text/plain; charset=utf-8", f"{type(e).__name__}: {e}".encode())] * len(jobs)
+        for job, result in zip(jobs, results):
+            if not job.future.done():
+                job.future.set_result(result)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await read_request_head(reader)
+                if head is None:
+                    break
+                method, target, version, headers = head
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version == "HTTP/1.1")
+                try:
+                    status, content_type, body = await self.route(method, target, headers, reader)
+                except HttpError as e:
+                    # Тело запроса могло остаться непрочитанным - соединение закрывается
+                    status, content_type, body = e.status, "text/plain; charset=utf-8", str(e).encode()
+                    keep_alive = False
+                extra = {"Retry-After": "1"} if status == 503 else None
+                await send_response(writer, status, content_type, body, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, target, headers, reader):
+        url = urlsplit(target)
+        path = url.path.rstrip("/")
+        if path == "/health":
+            return 200, "text/plain; charset=utf-8", b"ok\n"
+        if path == "/metrics":
+            return 200, "text/plain; version=0.0.4", self.format_metrics().encode()
+        if path == "/ops" and method == "GET":
+            listing = {name: defaults for name, (_, defaults, _) in operations.OPERATIONS.items()}
+            return 200, "application/json", json.dumps(listing, ensure_ascii=False).encode()
+        if not path.startswith("/ops/"):
+            raise HttpError(404, f"Нет такого адреса: {url.path}")
+        name = path[len("/ops/"):]
+        if name not in operations.OPERATIONS:
+            raise HttpError(404, f"Неизвестная операция: {name}")
+        if method != "POST":
+            raise HttpError(405, "Операции вызываются методом POST")
+
+        # Очередь заполнена - отказ до чтения тела, клиент повторит позже
+        if self.batcher.full():
+            self.rejected += 1
+            raise HttpError(503, "Очередь заполнена, повторите позже")
+        query = dict(parse_qsl(url.query))
+        image_format = query.pop("format", "png")
+        try:
+            params = operations.parse_params(name, query)
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        data = await read_body(reader, headers, self.max_body)
+
+        loop = asyncio.get_running_loop()
+        job = Job(name, data, loop.time(), loop.create_future())
+        try:
+            self.batcher.put((name, tuple(sorted(params.items())), image_format), job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return 503, "text/plain; charset=utf-8", "Очередь заполнена, повторите позже".encode()
+        status, content_type, body = await job.future
+        self.latency.record(name, loop.time() - job.arrived)
+        self.responses[(name, status)] = self.responses.get((name, status), 0) + 1
+        return status, content_type, body
+
+    def format_metrics(self):
+        lines = [
+            "# HELP service_queue_depth Requests waiting for a worker",
+            "# TYPE service_queue_depth gauge",
+            f"service_queue_depth {self.batcher.depth}",
+            "# HELP service_queue_capacity Maximum queue depth before 503",
+            "# TYPE service_queue_capacity gauge",
+            f"service_queue_capacity {self.batcher.max_depth}",
+            "# HELP service_batches_in_flight Batches submitted to the process pool",
+            "# TYPE service_batches_in_flight gauge",
+            f"service_batches_in_flight {self.in_flight}",
+            "# HELP service_workers Process pool size",
+            "# TYPE service_workers gauge",
+            f"service_workers {self.workers}",
+            "# HELP service_rejected_total Requests rejected because the queue was full",
+            "# TYPE service_rejected_total counter",
+            f"service_rejected_total {self.rejected}",
+            "# HELP service_batches_total Batches executed",
+            "# TYPE service_batches_total counter",
+            f"service_batches_total {self.batches}",
+            "# HELP service_batched_requests_total Requests executed in batches",
+            "# TYPE service_batched_requests_total counter",
+            f"service_batched_requests_total {self.batched_jobs}",
+            "# HELP service_responses_total Responses by operation and status",
+            "# TYPE service_responses_total counter",
+        ]
+        for (name, status), count in sorted(self.responses.items()):
+            lines.append(f'service_responses_total{{operation="{name}",status="{status}"}} {count}')
+        return ("\n".join(lines) + "\n"
+                + format_prometheus(self.latency.stats(), prefix="service_request")
+                + format_prometheus(self.queue_wait.stats(), prefix="service_queue_wait"))
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def read_request_head(reader):
+    # Строка запроса и заголовки; None, если клиент закрыл соединение
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise ConnectionError("Некорректная строка запроса")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+
+async def read_body(reader, headers, limit):
+    # Тело читается частями по мере поступления (Content-Length или chunked);
+    # превышение limit обрывает загрузку, не дожидаясь конца тела
+    body = bytearray()
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            line = await reader.readline()
+            try:
+                size = int(line.split(b";")[0].strip(), 16)
+            except ValueError:
+                raise HttpError(400, "Некорректный размер блока")
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass  # заголовки после тела не используются
+                break
+            if len(body) + size > limit:
+                raise HttpError(413, f"Тело запроса больше {limit} байт")
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+        return bytes(body)
+    if "content-length" not in headers:
+        raise HttpError(411, "Нужен заголовок Content-Length или Transfer-Encoding: chunked")
+    try:
+        remaining = int(headers["content-length"])
+    except ValueError:
+        raise HttpError(400, "Некорректный Content-Length")
+    if remaining > limit:
+        raise HttpError(413, f"Тело запроса больше {limit} байт")
+    while remaining:
+        chunk = await reader.read(min(STREAM_CHUNK, remaining))
+        if not chunk:
+            raise asyncio.IncompleteReadError(bytes(body), remaining)
+        body += chunk
+        remaining -= len(chunk)
+    return bytes(body)
+
+
+async def send_response(writer, status, content_type, body, keep_alive=True, extra_headers=None):
+    # Ответ отправляется частями с ожиданием drain(): медленный клиент не
+    # заставляет сервер буферизовать весь результат в сокете
+    headers = [f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}",
+               f"Content-Type: {content_type}",
+               f"Content-Length: {len(body)}",
+               f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    for key, value in (extra_headers or {}).items():
+        headers.append(f"{key}: {value}")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1"))
+    view = memoryview(body)
+    for start in range(0, len(view), STREAM_CHUNK):
+        writer.write(view[start:start + STREAM_CHUNK])
+        await writer.drain()
+    await writer.drain()
+
+
+async def serve(host, port, **options):
+    service = ImageService(**options)
+    server = await asyncio.start_server(service.handle, host, port)
+    dispatcher = asyncio.create_task(service.dispatch())
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"Сервис слушает http://{host}:{port} (процессов: {service.workers}, "
+          f"очередь: {service.batcher.max_depth}, пакет до {service.batcher.max_batch})")
+    async with server:
+        await stop.wait()
+    dispatcher.cancel()
+    service.close()
+    print("Сервис остановлен")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный HTTP-сервис операций лабораторных")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, help="число процессов (по умолчанию - число ядер)")
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="максимум ожидающих запросов, сверх него - ответ 503")
+    parser.add_argument("--max-batch", type=int, default=8, help="максимальный размер пакета")
+    parser.add_argument("--batch-wait-ms", type=float, default=2.0,
+                        help="сколько ждать попутчиков для неполного пакета")
+    parser.add_argument("--max-body-mb", type=float, default=64.0, help="максимальный размер загрузки")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, queue_size=args.queue_size,
+                          max_batch=args.max_batch, batch_wait=args.batch_wait_ms / 1000,
+                          max_body=int(args.max_body_mb * 1024 * 1024)))
+    except OSError as e:
+        print(f"Не удалось запустить сервис: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
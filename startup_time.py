@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+
+
+# Переменная окружения с моментом запуска процесса (time.time() родителя).
+# Если она задана, лабораторная закрывается после первого прохода цикла
+# событий и печатает в stderr время от запуска до этого момента
+PROBE_ENV = "LAB_STARTUP_PROBE"
+PROBE_PREFIX = "lab-startup"
+
+LABS = ("lab_1", "lab_2", "lab_3", "lab_4", "lab_5")
+
+
+def exit_after_startup(quit, schedule=None):
+    # quit - функция закрытия приложения, schedule - постановка функции в цикл
+    # событий (по умолчанию QTimer.singleShot(0, ...), для Tk - root.after_idle)
+    started = os.environ.get(PROBE_ENV)
+    if not started:
+        return
+
+    def finish():
+        print(f"{PROBE_PREFIX} {time.time() - float(started):.6f}", file=sys.stderr, flush=True)
+        quit()
+
+    if schedule is None:
+        from PyQt5.QtCore import QTimer
+        QTimer.singleShot(0, finish)
+    else:
+        schedule(finish)
+
+
+def parse_importtime(text):
+    # Строки вида "import time: self [us] | cumulative | name", вложенность
+    # обозначается отступом имени. Возвращает {модуль верхнего уровня: секунды}
+    totals = {}
+    for line in text.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2][1:]
+        if name.startswith(" "):
+            continue
+        totals[name.strip()] = totals.get(name.strip(), 0.0) + int(parts[1]) / 1e6
+    return totals
+
+
+def run_once(lab, env, importtime=False):
+    import subprocess
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command.append(f"{lab}.py")
+    env = dict(env, **{PROBE_ENV: repr(time.time())})
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(command, env=env, capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=120)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"{lab} не закрылся за 120 с")
+    total = time.perf_counter() - start
+    ready = None
+    for line in result.stderr.splitlines():
+        if line.startswith(PROBE_PREFIX):
+            ready = float(line.split()[1])
+    if ready is None:
+        raise RuntimeError(f"{lab} не сообщил о запуске (код {result.returncode}):\n"
+                           f"{result.stderr[-2000:]}")
+    return ready, total, result.stderr
+
+
+def measure_lab(lab, repeat=5, env=None):
+    # Время до первого прохода цикла событий и полное время процесса (медианы),
+    # плюс разбивка импортов по отдельному запуску с -X importtime
+    env = dict(os.environ if env is None else env)
+    ready_times, total_times = [], []
+    for _ in range(repeat):
+        ready, total, _ = run_once(lab, env)
+        ready_times.append(ready)
+        total_times.append(total)
+    _, _, stderr = run_once(lab, env, importtime=True)
+    ready_times.sort()
+    total_times.sort()
+    return {
+        "ready": ready_times[len(ready_times) // 2],
+        "ready_min": ready_times[0],
+        "total": total_times[len(total_times) // 2],
+        "imports": parse_importtime(stderr),
+    }
+
+
+def print_report(results, top=8, baseline=None):
+    for lab, r in results.items():
+        line = f"{lab}: окно готово за {r['ready'] * 1000:.0f} мс (мин. {r['ready_min'] * 1000:.0f}), " \
+               f"процесс {r['total'] * 1000:.0f} мс"
+        if baseline and lab in baseline:
+            before = baseline[lab]["ready"]
+            line += f", было {before * 1000:.0f} мс ({(r['ready'] - before) / before * 100:+.0f}%)"
+        print(line)
+        imports = sorted(r["imports"].items(), key=lambda item: item[1], reverse=True)
+        for name, seconds in imports[:top]:
+            print(f"    {name:<40}{seconds * 1000:8.1f} мс")
+
+
+def main():
+    import json
+    import argparse
+    parser = argparse.ArgumentParser(description="Замер времени запуска лабораторных")
+    parser.add_argument("labs", nargs="*", default=list(LABS), help="какие лабораторные запускать")
+    parser.add_argument("--repeat", type=int, default=5, help="число замеров на лабораторную")
+    parser.add_argument("--top", type=int, default=8, help="сколько самых долгих импортов показать")
+    parser.add_argument("--offscreen", action="store_true",
+                        help="запускать Qt без дисплея (QT_QPA_PLATFORM=offscreen)")
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON предыдущего замера для сравнения")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    results = {}
+    for lab in args.labs:
+        try:
+            results[lab] = measure_lab(lab, args.repeat, env)
+        except (RuntimeError, OSError) as e:
+            print(f"{lab}: не удалось измерить: {e}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, args.top, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,566 @@
+import os
+import time
+import queue
+import hashlib
+import threading
+from collections import Counter
+from lazy_imports import lazy_import
+from profiling import profiled
+
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+futures = lazy_import("concurrent.futures")
+
+
+# Обработка видео лабораторной 5 без Qt: конвейер кадров, вычитание фона,
+# пакетная обработка пулом процессов. Окно (lab_5) и режимы командной
+# строки используют этот модуль
+
+# Маркер конца потока кадров в очередях конвейера
+PIPELINE_END = object()
+
+
+class VideoPipeline:
+    # Потоковый конвейер: поток декодирования -> поток обработки -> очередь результатов.
+    # Очереди ограничены, поэтому декодер не убегает вперёд и память не растёт.
+    # realtime - воспроизведение в реальном времени: кадры, которые уже отстали
+    # от часов воспроизведения, пропускаются до обработки, а не после неё.
+    # pass_index - process_frame вызывается как process_frame(кадр, номер кадра
+    # в исходном видео), чтобы обработка знала, сколько кадров пропущено
+    def __init__(self, path, process_frame, queue_size=4, name="lab_5.video", realtime=False,
+                 pass_index=False):
+        self.cap = cv2.VideoCapture(path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 1 else 30.0
+        # Обработка кадра замеряется профилировщиком под именем name
+        self.process_frame = profiled(name)(process_frame)
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.results = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.threads = []
+        # Суммарное время работы стадий и число кадров - для отчёта о производительности
+        self.stage_time = {"decode": 0.0, "process": 0.0}
+        self.frame_count = 0
+        self.dropped = 0
+        self.realtime = realtime
+        self.pass_index = pass_index
+        self.start_time = None
+        # Исключение из потока декодирования или обработки; конвейер после
+        # него завершается, а next_result() выбрасывает его в вызывающем потоке
+        self.error = None
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.threads = [threading.Thread(target=self._decode, daemon=True),
+                        threading.Thread(target=self._process, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        self.cap.release()
+
+    def next_result(self):
+        # Ожидание следующего результата обработки (или PIPELINE_END)
+        item = self._get(self.results)
+        if item is PIPELINE_END and self.error is not None:
+            raise self.error
+        return item
+
+    def target_index(self):
+        # Номер кадра, который по часам воспроизведения должен быть на экране
+        return int((time.perf_counter() - self.start_time) * self.fps)
+
+    def _put(self, q, item):
+        # Блокирующая запись, которая прерывается по stop()
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return PIPELINE_END
+
+    def _decode(self):
+        index = 0
+        try:
+            while not self.stop_event.is_set():
+                start = time.perf_counter()
+                if self.realtime and index < self.target_index():
+                    # Отставший кадр только извлекается из потока, без преобразования
+                    ret, frame = self.cap.grab(), None
+                else:
+                    ret, frame = self.cap.read()
+                self.stage_time["decode"] += time.perf_counter() - start
+                if not ret:
+                    break
+                if frame is None:
+                    self.dropped += 1
+                elif not self._put(self.frames, (index, frame)):
+                    return
+                index += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(self.frames, PIPELINE_END)
+
+    def _process(self):
+        try:
+            while True:
+                item = self._get(self.frames)
+                if item is PIPELINE_END:
+                    break
+                index, frame = item
+                if self.realtime and index < self.target_index():
+                    # Кадр отстал, пока ждал в очереди: обрабатывать его уже поздно
+                    self.dropped += 1
+                    continue
+                start = time.perf_counter()
+                result = self.process_frame(frame, index) if self.pass_index else self.process_frame(frame)
+                self.stage_time["process"] += time.perf_counter() - start
+                self.frame_count += 1
+                if result is not None and not self._put(self.results, (index, result)):
+                    return
+        except Exception as e:
+            self.error = e
+        finally:
+            # Конец потока кадров передаётся всегда, иначе next_result() ждал бы вечно
+            self._put(self.results, PIPELINE_END)
+
+
+def fit_to_size(image, max_width, max_height):
+    # Уменьшение кадра под размер окна (выполняется в потоке обработки, а не в GUI)
+    h, w = image.shape[:2]
+    ratio = min(max_width / w, max_height / h, 1.0)
+    if ratio >= 1.0:
+        return image
+    return cv2.resize(image, (max(1, int(w * ratio)), max(1, int(h * ratio))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def blur_moving_objects(frame, fgmask):
+    blurred = cv2.GaussianBlur(frame, (51, 51), 0)
+    return np.where(fgmask[..., None] > 0, blurred, frame)
+
+
+def merge_rects(rects, pad):
+    # Объединение прямоугольников, окрестности которых пересекаются,
+    # чтобы каждая область размывалась по исходным (ещё не размытым) пикселям
+    rects = [list(r) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if (a[0] - pad < b[2] + pad and b[0] - pad < a[2] + pad and
+                        a[1] - pad < b[3] + pad and b[1] - pad < a[3] + pad):
+                    rects[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+class RoiMotionBlur:
+    # Оптимизированное размытие движущихся объектов: маска MOG2 считается
+    # на уменьшенном кадре, а размываются только окрестности связных областей
+    # переднего плана. Стоимость зависит от площади движения, а не от размера кадра.
+    BLUR_SIZE = 51
+    BLUR_SIGMA = 0.3 * ((BLUR_SIZE - 1) * 0.5 - 1) + 0.8  # как у GaussianBlur при sigma=0
+    FAST_BLUR_FACTOR = 4
+
+    def __init__(self, mask_scale=0.5, pad=BLUR_SIZE // 2, fast_blur=False, min_area=16):
+        self.fgbg = cv2.createBackgroundSubtractorMOG2()
+        self.mask_scale = mask_scale
+        self.pad = pad
+        self.fast_blur = fast_blur
+        # Минимальная площадь области (в пикселях уменьшенной маски) - отсекает шум MOG2
+        self.min_area = min_area
+
+    def foreground_mask(self, frame):
+        if self.mask_scale != 1.0:
+            frame = cv2.resize(frame, None, fx=self.mask_scale, fy=self.mask_scale,
+                               interpolation=cv2.INTER_AREA)
+        return self.fgbg.apply(frame)
+
+    def blur(self, region):
+        # Приближение большого гауссова ядра: уменьшение -> малое размытие -> увеличение
+        factor = self.FAST_BLUR_FACTOR
+        if self.fast_blur and min(region.shape[:2]) >= 4 * factor:
+            h, w = region.shape[:2]
+            small = cv2.resize(region, (w // factor, h // factor), interpolation=cv2.INTER_AREA)
+            small = cv2.GaussianBlur(small, (0, 0), self.BLUR_SIGMA / factor)
+            return cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
+        return cv2.GaussianBlur(region, (self.BLUR_SIZE, self.BLUR_SIZE), 0)
+
+    def apply(self, frame):
+        # Размывает движущиеся объекты прямо в кадре, возвращает уменьшенную маску
+        h, w = frame.shape[:2]
+        small_mask = self.foreground_mask(frame)
+        sh, sw = small_mask.shape
+        fx, fy = w / sw, h / sh
+
+        _, _, stats, _ = cv2.connectedComponentsWithStats(small_mask)
+        rects = [(x, y, x + bw, y + bh) for x, y, bw, bh, area in stats[1:]
+                 if area >= self.min_area]
+        pad_small = int(np.ceil(self.pad / min(fx, fy)))
+        for sx0, sy0, sx1, sy1 in merge_rects(rects, pad_small):
+            x0, y0 = int(round(sx0 * fx)), int(round(sy0 * fy))
+            x1, y1 = min(w, int(round(sx1 * fx))), min(h, int(round(sy1 * fy)))
+            if x1 <= x0 or y1 <= y0:
+                continue
+            mask = cv2.resize(small_mask[sy0:sy1, sx0:sx1], (x1 - x0, y1 - y0),
+                              interpolation=cv2.INTER_NEAREST)
+            px0, py0 = max(0, x0 - self.pad), max(0, y0 - self.pad)
+            px1, py1 = min(w, x1 + self.pad), min(h, y1 + self.pad)
+            blurred = self.blur(frame[py0:py1, px0:px1])
+            core = blurred[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+            np.copyto(frame[y0:y1, x0:x1], core, where=(mask > 0)[..., None])
+        return small_mask
+
+    def full_mask(self, small_mask, frame_shape):
+        h, w = frame_shape[:2]
+        if small_mask.shape[:2] == (h, w):
+            return small_mask
+        return cv2.resize(small_mask, (w, h), interpolation=cv2.INTER_NEAREST)
+
+
+class AdaptiveResolutionController:
+    # Регулятор с обратной связью: по измеренному времени обработки кадра
+    # подбирает масштаб обработки и долю пропускаемых кадров так,
+    # чтобы удерживать заданную частоту кадров
+    SCALES = (1.0, 0.75, 0.5, 0.35, 0.25)
+    MAX_SKIP = 4
+    HIGH_LOAD = 0.9   # доля бюджета, выше которой качество понижается
+    LOW_LOAD = 0.6    # прогнозируемая доля бюджета, ниже которой качество повышается
+
+    def __init__(self, target_fps, cooldown=15, smoothing=0.2):
+        self.frame_budget = 1.0 / target_fps
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.level = 0
+        self.skip = 1  # обрабатывается каждый skip-й кадр
+        self.avg_time = None
+        self.frames_since_change = 0
+
+    @property
+    def scale(self):
+        return self.SCALES[self.level]
+
+    def load(self):
+        # Доля доступного времени, занятая обработкой (на один обработанный кадр
+        # приходится skip кадров исходного видео)
+        return self.avg_time / (self.skip * self.frame_budget)
+
+    def update(self, elapsed):
+        # Возвращает True, если изменился масштаб обработки
+        if self.avg_time is None:
+            self.avg_time = elapsed
+        else:
+            self.avg_time += self.smoothing * (elapsed - self.avg_time)
+        self.frames_since_change += 1
+        if self.frames_since_change < self.cooldown:
+            return False
+
+        load = self.load()
+        old_level, old_skip = self.level, self.skip
+        if load > self.HIGH_LOAD:
+            if self.level < len(self.SCALES) - 1:
+                self.level += 1
+            elif self.skip < self.MAX_SKIP:
+                self.skip += 1
+        elif self.skip > 1:
+            if load * self.skip / (self.skip - 1) < self.LOW_LOAD:
+                self.skip -= 1
+        elif self.level > 0:
+            # Время обработки растёт примерно пропорционально площади кадра
+            growth = (self.SCALES[self.level - 1] / self.scale) ** 2
+            if load * growth < self.LOW_LOAD:
+                self.level -= 1
+
+        if (self.level, self.skip) != (old_level, old_skip):
+            if self.level != old_level:
+                self.avg_time = None
+            self.frames_since_change = 0
+        return self.level != old_level
+
+
+class AdaptiveBackgroundSubtraction:
+    # Вычитание фона в реальном времени с адаптивным разрешением.
+    # Модель MOG2 привязана к размеру кадра: при смене масштаба OpenCV
+    # всё равно переинициализирует её, поэтому создаётся новая модель,
+    # которая обучается заново с автоматической скоростью обучения.
+    def __init__(self, target_fps):
+        self.controller = AdaptiveResolutionController(target_fps)
+        self.fgbg = cv2.createBackgroundSubtractorMOG2()
+        self.model_frames = 0
+        self.frame_index = 0
+        self.last_index = None
+
+    def learning_rate(self, gap):
+        # Пока модель не прогрета, OpenCV сам выбирает скорость обучения 1/(2n).
+        # gap - сколько кадров исходного видео прошло с предыдущего обработанного
+        # (собственные пропуски регулятора и кадры, отброшенные конвейером):
+        # скорость увеличивается, чтобы модель забывала фон за то же время
+        history = self.fgbg.getHistory()
+        if gap <= 1 or 2 * self.model_frames < history:
+            return -1
+        return 1.0 - (1.0 - 1.0 / history) ** gap
+
+    def process(self, frame, index=None):
+        # Возвращает (маска, масштаб, время обработки) или None для пропущенного кадра.
+        # index - номер кадра в исходном видео; без него кадры считаются идущими подряд
+        if index is None:
+            index = self.frame_index
+        self.frame_index = index + 1
+        if self.last_index is not None and index - self.last_index < self.controller.skip:
+            return None
+        gap = 1 if self.last_index is None else index - self.last_index
+        self.last_index = index
+        start = time.perf_counter()
+        scale = self.controller.scale
+        small = frame
+        if scale != 1.0:
+            small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        fgmask = self.fgbg.apply(small, learningRate=self.learning_rate(gap))
+        self.model_frames += 1
+        elapsed = time.perf_counter() - start
+        if self.controller.update(elapsed):
+            self.fgbg = cv2.createBackgroundSubtractorMOG2()
+            self.model_frames = 0
+        return fgmask, scale, elapsed
+
+
+def open_video_writer(path, fps, frame_size, is_color=True):
+    # Кодек выбирается по расширению выходного файла
+    fourcc = cv2.VideoWriter_fourcc(*("MJPG" if path.lower().endswith(".avi") else "mp4v"))
+    writer = cv2.VideoWriter(path, fourcc, fps, frame_size, is_color)
+    if not writer.isOpened():
+        raise IOError(f"Не удалось открыть файл для записи: {path}")
+    return writer
+
+
+def process_video_headless(path, mask_path=None, blur_path=None, queue_size=8,
+                           roi_blur=None):
+    # Обработка видео без окна с максимальной скоростью: декодирование и обработка
+    # идут в потоках конвейера, кодирование - в вызывающем потоке.
+    # roi_blur - экземпляр RoiMotionBlur для оптимизированного режима
+    fgbg = cv2.createBackgroundSubtractorMOG2()
+
+    def process(frame):
+        if roi_blur is not None:
+            small_mask = roi_blur.apply(frame)
+            fgmask = roi_blur.full_mask(small_mask, frame.shape) if mask_path else small_mask
+            return fgmask, frame
+        fgmask = fgbg.apply(frame)
+        blurred = blur_moving_objects(frame, fgmask) if blur_path else None
+        return fgmask, blurred
+
+    pipeline = VideoPipeline(path, process, queue_size=queue_size, name="lab_5.video_headless")
+    if not pipeline.is_opened():
+        raise IOError(f"Не удалось открыть видео: {path}")
+
+    mask_writer = blur_writer = None
+    encode_time = 0.0
+    start = time.perf_counter()
+    pipeline.start()
+    try:
+        while True:
+            item = pipeline.next_result()
+            if item is PIPELINE_END:
+                break
+            _, (fgmask, blurred) = item
+            encode_start = time.perf_counter()
+            if mask_path:
+                h, w = fgmask.shape[:2]
+                if mask_writer is None:
+                    mask_writer = open_video_writer(mask_path, pipeline.fps, (w, h), is_color=False)
+                mask_writer.write(fgmask)
+            if blur_path:
+                if blur_writer is None:
+                    h, w = blurred.shape[:2]
+                    blur_writer = open_video_writer(blur_path, pipeline.fps, (w, h))
+                blur_writer.write(blurred.astype(np.uint8))
+            encode_time += time.perf_counter() - encode_start
+    finally:
+        pipeline.stop()
+        for writer in (mask_writer, blur_writer):
+            if writer is not None:
+                writer.release()
+    total_time = time.perf_counter() - start
+
+    frames = pipeline.frame_count
+    stage_time = dict(pipeline.stage_time, encode=encode_time)
+    return {
+        "frames": frames,
+        "total_time": total_time,
+        "fps": frames / total_time if total_time > 0 else 0.0,
+        "stage_fps": {stage: (frames / t if t > 0 else 0.0) for stage, t in stage_time.items()},
+    }
+
+
+def print_video_report(path, report):
+    print(f"{path}: {report['frames']} кадров за {report['total_time']:.2f} с "
+          f"({report['fps']:.1f} FPS)")
+    for stage, fps in report["stage_fps"].items():
+        print(f"  {stage:<8} {fps:8.1f} FPS")
+
+
+def plan_video_tasks(paths, out_dir, segment_frames=None, warmup=100, ext=".avi",
+                     roi_blur=False, mask_scale=0.5, fast_blur=False):
+    # Разбиение списка видео на задачи для пула процессов. Длинные файлы делятся
+    # на сегменты; каждый сегмент начинает обучение MOG2 за warmup кадров до
+    # своего начала, чтобы модель фона успела сойтись до записи результата
+    unique_paths, seen = [], set()
+    for path in paths:
+        full_path = os.path.abspath(path)
+        if full_path in seen:
+            print(f"{path}: указан повторно, пропускается")
+            continue
+        seen.add(full_path)
+        unique_paths.append(path)
+    # Одинаковые имена файлов из разных каталогов получают к имени результата
+    # короткий хеш полного пути, иначе их результаты перезаписывали бы друг друга
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in unique_paths]
+    stem_counts = Counter(stems)
+    tasks = []
+    for path, stem in zip(unique_paths, stems):
+        if stem_counts[stem] > 1:
+            stem += "_" + hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+        frame_count = 0
+        if segment_frames:
+            # Длина нужна только для деления на сегменты
+            cap = cv2.VideoCapture(path)
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+        if segment_frames and frame_count > segment_frames:
+            bounds = [(start, min(start + segment_frames, frame_count))
+                      for start in range(0, frame_count, segment_frames)]
+        else:
+            bounds = [(0, None)]
+        for part, (start, end) in enumerate(bounds):
+            suffix = f"_part{part:03d}" if len(bounds) > 1 else ""
+            tasks.append({
+                "path": path,
+                "part": part,
+                "parts": len(bounds),
+                "start": start,
+                "end": end,
+                "warmup": warmup,
+                "mask_path": os.path.join(out_dir, f"{stem}_mask{suffix}{ext}"),
+                "blur_path": os.path.join(out_dir, f"{stem}_blur{suffix}{ext}"),
+                "roi_blur": roi_blur,
+                "mask_scale": mask_scale,
+                "fast_blur": fast_blur,
+            })
+    return tasks
+
+
+def process_video_segment(task):
+    # Обработка одного файла или сегмента в процессе пула: своя модель MOG2
+    # на задачу, OpenCV работает в один поток, параллелизм - за счёт процессов
+    cv2.setNumThreads(1)
+    start_time = time.perf_counter()
+    cap = cv2.VideoCapture(task["path"])
+    if not cap.isOpened():
+        raise IOError(f"Не удалось открыть видео: {task['path']}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    fps = fps if fps and fps > 1 else 30.0
+
+    start, end = task["start"], task["end"]
+    index = max(0, start - task["warmup"]) if start else 0
+    if index:
+        # Позиционирование по ключевым кадрам может быть неточным,
+        # но на результат это влияет только в пределах прогрева
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+    roi_blur = None
+    fgbg = None
+    if task["roi_blur"]:
+        roi_blur = RoiMotionBlur(task["mask_scale"], fast_blur=task["fast_blur"])
+    else:
+        fgbg = cv2.createBackgroundSubtractorMOG2()
+
+    mask_writer = blur_writer = None
+    written = 0
+    try:
+        while end is None or index < end:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if roi_blur is not None:
+                fgmask = roi_blur.full_mask(roi_blur.apply(frame), frame.shape)
+                blurred = frame
+            else:
+                fgmask = fgbg.apply(frame)
+                blurred = blur_moving_objects(frame, fgmask).astype(np.uint8) if index >= start else None
+            if index >= start:
+                h, w = frame.shape[:2]
+                if mask_writer is None:
+                    mask_writer = open_video_writer(task["mask_path"], fps, (w, h), is_color=False)
+                    blur_writer = open_video_writer(task["blur_path"], fps, (w, h))
+                mask_writer.write(fgmask)
+                blur_writer.write(blurred)
+                written += 1
+            index += 1
+    finally:
+        cap.release()
+        for writer in (mask_writer, blur_writer):
+            if writer is not None:
+                writer.release()
+    return {"path": task["path"], "part": task["part"], "parts": task["parts"],
+            "frames": written, "time": time.perf_counter() - start_time}
+
+
+def process_videos_batch(paths, out_dir, workers=None, **options):
+    # Параллельная обработка множества видео пулом процессов с выводом
+    # прогресса по файлам и итоговой пропускной способности
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = plan_video_tasks(paths, out_dir, **options)
+    remaining = {}
+    for task in tasks:
+        remaining[task["path"]] = remaining.get(task["path"], 0) + 1
+
+    total_frames = 0
+    failed = 0
+    start = time.perf_counter()
+    with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        submitted = {pool.submit(process_video_segment, task): task for task in tasks}
+        for done, future in enumerate(futures.as_completed(submitted), 1):
+            task = submitted[future]
+            path = task["path"]
+            remaining[path] -= 1
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(tasks)}] {path} (часть {task['part'] + 1}/{task['parts']}): "
+                      f"ошибка: {e}")
+                continue
+            total_frames += result["frames"]
+            fps = result["frames"] / result["time"] if result["time"] > 0 else 0.0
+            status = "готово" if remaining[path] == 0 else f"осталось частей: {remaining[path]}"
+            print(f"[{done}/{len(tasks)}] {path} (часть {result['part'] + 1}/{result['parts']}): "
+                  f"{result['frames']} кадров, {fps:.1f} FPS - {status}")
+    total_time = time.perf_counter() - start
+
+    print(f"Файлов: {len(remaining)}, задач: {len(tasks)}, ошибок: {failed}")
+    print(f"Всего {total_frames} кадров за {total_time:.2f} с "
+          f"({total_frames / total_time if total_time > 0 else 0.0:.1f} FPS суммарно)")
+    return total_frames, total_time